@@ -0,0 +1,150 @@
+"""
+This module defines a process-wide pool of warm AI agents, so that requests reuse
+already constructed LLM clients, embedding clients and tools.
+"""
+
+"""Step 1: Import necessary modules"""
+# -- Standard libraries --
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# -- Custom modules --
+from .study_buddy_agent import StudyBuddyAIAgent
+from utils.consts import AGENT_POOL_MAX_IDLE_PER_KEY, AGENT_POOL_MAX_KEYS
+from utils.metrics import register_metrics_source
+
+
+"""Step 2: Define the AgentPool class"""
+class AgentPool:
+    """
+    A pool of idle agents keyed by (desired_role, tool set).
+
+    Agents are handed out exclusively through `checkout` and are reset before they
+    are returned to the pool. Least recently used keys are evicted once the pool
+    holds more than `max_keys` distinct keys.
+    """
+
+    def __init__(self, factory, max_idle_per_key: int = AGENT_POOL_MAX_IDLE_PER_KEY, max_keys: int = AGENT_POOL_MAX_KEYS):
+        """
+        Initializes an AgentPool object.
+
+        Args:
+            factory (callable): Builds a new agent from `tool_names` and `desired_role` keyword arguments.
+            max_idle_per_key (int): The maximum number of idle agents kept for a single key.
+            max_keys (int): The maximum number of distinct keys kept in the pool.
+        """
+        self._factory = factory
+        self._max_idle_per_key = max_idle_per_key
+        self._max_keys = max_keys
+        self._idle = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(desired_role: str, tool_names: list[str]) -> tuple:
+        return (desired_role, frozenset(tool_names))
+
+    def acquire(self, desired_role: str, tool_names: list[str]):
+        """
+        Takes an idle agent for the given key out of the pool, or builds a new one.
+
+        Args:
+            desired_role (str): The role the agent acts as.
+            tool_names (list[str]): The names of the tools the agent uses.
+        """
+        key = self.make_key(desired_role, tool_names)
+        agent = None
+
+        with self._lock:
+            idle_agents = self._idle.get(key)
+            if idle_agents:
+                agent = idle_agents.pop()
+                self._idle.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if agent is None:
+            logging.info(f"Agent pool miss for role '{desired_role}'. Building a new agent.")
+            agent = self._factory(tool_names=list(tool_names), desired_role=desired_role)
+
+        return agent
+
+    def release(self, agent, desired_role: str, tool_names: list[str]):
+        """
+        Resets an agent's per-request state and returns it to the pool.
+
+        Args:
+            agent: The agent previously obtained from `acquire`.
+            desired_role (str): The role the agent was acquired for.
+            tool_names (list[str]): The tool names the agent was acquired for.
+        """
+        key = self.make_key(desired_role, tool_names)
+        agent.reset()
+
+        with self._lock:
+            idle_agents = self._idle.setdefault(key, [])
+            self._idle.move_to_end(key)
+
+            if len(idle_agents) < self._max_idle_per_key:
+                idle_agents.append(agent)
+            else:
+                self.evictions += 1
+
+            while len(self._idle) > self._max_keys:
+                _, evicted_agents = self._idle.popitem(last=False)
+                self.evictions += len(evicted_agents)
+
+    @contextmanager
+    def checkout(self, desired_role: str, tool_names: list[str]):
+        """
+        Lends an agent for the duration of a `with` block.
+
+        Agents whose request raised an exception are discarded instead of being returned to the pool.
+
+        Args:
+            desired_role (str): The role the agent acts as.
+            tool_names (list[str]): The names of the tools the agent uses.
+        """
+        agent = self.acquire(desired_role, tool_names)
+        try:
+            yield agent
+        except BaseException:
+            agent.reset()
+            with self._lock:
+                self.evictions += 1
+            raise
+        else:
+            self.release(agent, desired_role, tool_names)
+
+    def clear(self):
+        """
+        Drops every idle agent in the pool.
+        """
+        with self._lock:
+            self.evictions += sum(len(agents) for agents in self._idle.values())
+            self._idle.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns the pool's hit, miss and eviction counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "keys": len(self._idle),
+                "idle_agents": sum(len(agents) for agents in self._idle.values()),
+            }
+
+
+"""Step 3: Create the process-wide pool"""
+study_buddy_agent_pool = AgentPool(StudyBuddyAIAgent)
+register_metrics_source("agent_pool", study_buddy_agent_pool.stats)
@@ -4,23 +4,21 @@ This module defines a general structure for AI agents in the app.
 
 """Step 1: Import necessary modules"""
 # -- Standard libraries --
+import asyncio
+import functools
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 # -- 3rd Party libraries --
 ## Langchain
-from langchain_community.vectorstores.azure_cosmos_db import (
-    AzureCosmosDBVectorSearch,
-    CosmosDBSimilarityType,
-    CosmosDBVectorSearchType,
-)
 from langchain.agents import Tool
 from langchain.tools import StructuredTool
 from langchain_core.messages import SystemMessage
 from langchain_core.vectorstores import VectorStoreRetriever
 from langchain_community.document_loaders.mongodb import MongodbLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.schema import Document
 ## MongoDB
+import pymongo
 from pymongo.database import Database
 
 # -- Custom Modules --
@@ -29,10 +27,133 @@ from services.azure_open_ai import (
     get_azure_openai_llm,
     get_azure_openai_embeddings,
 )
+from services.vector_store_registry import vector_store_registry
+from services.agent_facts_index import agent_facts_index
+from services.tool_result_cache import tool_result_cache
+from utils.agents import TOOL_ERROR_MESSAGES
+from utils.consts import TOOL_EXECUTOR_MAX_WORKERS, TOOL_QUEUE_TIMEOUT_SECONDS, DEFAULT_TOOL_TIMEOUT_SECONDS
+from utils.metrics import register_metrics_source
 from utils.docs import format_docs
 from .tools import toolbox
 
 
+# Retriever tools served from an in-memory index instead of Cosmos DB
+in_memory_indexes = {
+    "agent_facts": agent_facts_index,
+}
+
+# Tools run on a bounded pool, so that several tool calls of one agent step
+# run concurrently on the async path without an unbounded number of threads
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_EXECUTOR_MAX_WORKERS, thread_name_prefix="agent-tool")
+_tool_stats_lock = threading.Lock()
+_tool_stats = {"calls": 0, "timeouts": 0, "queue_timeouts": 0, "running_after_timeout": 0}
+
+
+def _count_tool_event(counter: str, delta: int = 1):
+    with _tool_stats_lock:
+        _tool_stats[counter] += delta
+
+
+def get_tool_executor_stats() -> dict:
+    with _tool_stats_lock:
+        return dict(_tool_stats)
+
+
+def with_timeout(tool_name: str, func, timeout: float):
+    """
+    Wraps a blocking tool function so that it runs on the tool pool under a backstop timeout.
+
+    Timeouts are enforced where the tools do I/O: the HTTP clients and the MongoDB client
+    have their own timeouts, and Mongo operations inside a tool run under `pymongo.timeout`.
+    The wrapper only stops waiting for a tool whose I/O layer did not give up in time, as
+    a running thread cannot be stopped. Waiting for a free tool thread is bounded by
+    TOOL_QUEUE_TIMEOUT_SECONDS and does not count towards the tool's timeout.
+
+    Args:
+        tool_name: The name of the tool, used in the timeout message.
+        func: The blocking tool function.
+        timeout: The number of seconds to wait for the tool once it has started.
+
+    Returns:
+        tuple: The sync function and the coroutine to pass to the LangChain tool.
+    """
+    timeout_message = f"The '{tool_name}' tool did not respond within {timeout} seconds."
+    busy_message = f"The '{tool_name}' tool is busy at the moment. Please try again shortly."
+
+    def run_in_pool(on_start, args, kwargs):
+        on_start()
+        with pymongo.timeout(timeout):
+            return func(*args, **kwargs)
+
+    def submit(on_start, args, kwargs):
+        _count_tool_event("calls")
+        return tool_executor.submit(run_in_pool, on_start, args, kwargs)
+
+    def on_timeout(future):
+        # The thread keeps its pool slot until the tool's own I/O timeouts fire
+        logging.warning(timeout_message)
+        _count_tool_event("timeouts")
+        _count_tool_event("running_after_timeout")
+        future.add_done_callback(lambda _: _count_tool_event("running_after_timeout", -1))
+        return timeout_message
+
+    def on_queue_timeout():
+        logging.warning(f"The '{tool_name}' tool waited more than {TOOL_QUEUE_TIMEOUT_SECONDS} seconds for a free tool thread.")
+        _count_tool_event("queue_timeouts")
+        return busy_message
+
+    @functools.wraps(func)
+    def run_sync(*args, **kwargs):
+        started = threading.Event()
+        future = submit(started.set, args, kwargs)
+
+        # A call that has not started yet can still be cancelled
+        if not started.wait(TOOL_QUEUE_TIMEOUT_SECONDS) and future.cancel():
+            return on_queue_timeout()
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            return on_timeout(future)
+
+    @functools.wraps(func)
+    async def run_async(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        started = asyncio.Event()
+        future = submit(lambda: loop.call_soon_threadsafe(started.set), args, kwargs)
+
+        try:
+            await asyncio.wait_for(started.wait(), TOOL_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            if future.cancel():
+                return on_queue_timeout()
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            return on_timeout(future)
+
+    return run_sync, run_async
+
+
+def wrap_community_tool(tool, timeout: float) -> StructuredTool:
+    """
+    Returns a copy of a LangChain community tool that runs on the tool pool under a backstop timeout.
+    """
+    def run_tool(**kwargs):
+        return tool.invoke(kwargs)
+
+    func, coroutine = with_timeout(tool.name, run_tool, timeout)
+    return StructuredTool(
+        name=tool.name,
+        func=func,
+        coroutine=coroutine,
+        description=tool.description,
+        args_schema=tool.args_schema,
+    )
+
+
+register_metrics_source("agent_tools", get_tool_executor_stats)
+
+
 """Step 2: Define the AIAgent class"""
 class AIAgent:
     """
@@ -55,6 +176,13 @@ class AIAgent:
             ]
         )
         self.tools = self._create_agent_tools(tool_names)
+        self.agent_executor = None
+
+    def reset(self):
+        """
+        Clears the per-request state so that the agent can be reused by another request.
+        """
+        self.agent_executor = None
 
     def run(self, message: str) -> str:
         """
@@ -69,91 +197,15 @@ class AIAgent:
     def _get_vector_store_retriever(self, collection_name, top_k=3) -> VectorStoreRetriever:
         """
         Returns a vector store retriever for a given collection using Azure Cosmos DB.
+        The underlying vector store is cached process-wide by the vector store registry.
 
         Args:
             collection_name: The name of the collection to retrieve.
             top_k: The number of similar documents to retrieve.
         """
-        db = self.db
-        db_name = MongoDBClient.get_db_name()
-        CONNECTION_STRING = MongoDBClient.get_mongodb_variables()
-        embeddings_model = self.embedding_model
-        vector_store_name = f"{collection_name}_vector_store"
-        vector_store_collection = self.db[vector_store_name]
-
-        # Check if the vector store exists
-        if db[vector_store_name].find_one({}):
-            logging.info(f"Vector store '{vector_store_name}' exists. Loading existing vector store.")
-            vector_store = AzureCosmosDBVectorSearch.from_connection_string(
-                connection_string=CONNECTION_STRING,
-                namespace=f"{db_name}.{vector_store_name}",
-                embedding=embeddings_model,
-                index_name="VectorSearchIndex",
-                embedding_key="vectorContent",
-                text_key="textContent",
-            )
-        else:
-            logging.info(f"Vector store '{vector_store_name}' does not exist. Creating new vector store.")
-            # Manually fetch documents from MongoDB
-            collection = db[collection_name]
-            documents_cursor = collection.find({})
-            documents = list(documents_cursor)
-            logging.info(f"Loaded {len(documents)} documents from collection '{collection_name}'.")
-
-            # Create LangChain Document objects
-            docs = []
-            for doc in documents:
-                page_content = doc.get('fact', '')
-                metadata = {'sample_query': doc.get('sample_query', '')}
-                if page_content.strip():  # Ensure there's content
-                    docs.append(Document(page_content=page_content, metadata=metadata))
-
-            logging.info(f"Documents with content: {len(docs)}")
-
-            if not docs:
-                logging.error("No documents to index. Exiting retriever creation.")
-                return None
-
-            # Split the documents
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=20,
-                length_function=len,
-                is_separator_regex=False,
-            )
-
-            docs = text_splitter.split_documents(docs)
-            logging.info(f"Split documents into {len(docs)} chunks.")
-
-            if not docs:
-                logging.error("No documents to index after splitting. Exiting retriever creation.")
-                return None
-
-            # Create the vector store
-            vector_store = AzureCosmosDBVectorSearch.from_documents(
-                docs,
-                embeddings_model,
-                collection=vector_store_collection,
-                index_name="vectorSearchIndex",
-            )
-
-            num_lists = 1
-            dimensions = 1536
-            similarity_algorithm = CosmosDBSimilarityType.COS
-            kind = CosmosDBVectorSearchType.VECTOR_IVF
-            m = 16
-            ef_construction = 64
-
-            vector_store.create_index(
-                num_lists, dimensions, similarity_algorithm, kind, m, ef_construction
-            )
-            logging.info("Vector store index created successfully.")
-
-        retriever = vector_store.as_retriever(search_kwargs={"k": top_k})
-        return retriever
-
-
-
+        return vector_store_registry.get_retriever(
+            collection_name, top_k=top_k, embedding_model=self.embedding_model
+        )
 
     def _create_agent_tools(self, tool_names=[]) -> list[Tool]:
         """
@@ -174,14 +226,28 @@ class AIAgent:
 
         community_tools = []
         for tool_name, tool_val in target_tools.get("community").items():
-            community_tools.append(tool_val)
+            community_tools.append(wrap_community_tool(tool_val, DEFAULT_TOOL_TIMEOUT_SECONDS))
 
         custom_tools = []
         for tool_name, tool_dict in target_tools.get("custom", {}).items():
             description = tool_dict.get("description")
             args_schema = tool_dict.get("args_schema")
+            timeout = tool_dict.get("timeout", DEFAULT_TOOL_TIMEOUT_SECONDS)
 
-            if tool_dict.get("retriever", False):
+            if tool_dict.get("retriever", False) and tool_dict.get("in_memory_index", False):
+                # Small, static collections are searched in memory
+                func, coroutine = with_timeout(tool_name, in_memory_indexes[tool_name].answer, timeout)
+
+                custom_tools.append(
+                    StructuredTool(
+                        name=f"vector_search_{tool_name}",
+                        func=func,
+                        coroutine=coroutine,
+                        description=description,
+                        args_schema=args_schema,
+                    )
+                )
+            elif tool_dict.get("retriever", False):
                 # For retriever tools, define the function here with access to self
                 retriever = self._get_vector_store_retriever(tool_name)
                 retriever_chain = retriever | format_docs
@@ -189,30 +255,39 @@ class AIAgent:
                 def retriever_func(query: str):
                     return retriever_chain.invoke(query)
 
+                func, coroutine = with_timeout(tool_name, retriever_func, timeout)
                 custom_tools.append(
                     StructuredTool(
                         name=f"vector_search_{tool_name}",
-                        func=retriever_func,
+                        func=func,
+                        coroutine=coroutine,
                         description=description,
                         args_schema=args_schema,
                     )
                 )
             elif tool_dict.get("structured", False):
                 func = tool_dict.get("func")
+                if tool_dict.get("cache_ttl"):
+                    # Results of external API searches are reused across users and requests
+                    func = tool_result_cache.wrap(tool_name, func, tool_dict["cache_ttl"], TOOL_ERROR_MESSAGES)
+
+                func, coroutine = with_timeout(tool_name, func, timeout)
                 custom_tools.append(
                     StructuredTool(
                         name=tool_name,
                         func=func,
+                        coroutine=coroutine,
                         description=description,
                         args_schema=args_schema,
                     )
                 )
             else:
-                func = tool_dict.get("func")
+                func, coroutine = with_timeout(tool_name, tool_dict.get("func"), timeout)
                 custom_tools.append(
                     Tool(
                         name=tool_name,
                         func=func,
+                        coroutine=coroutine,
                         description=description,
                     )
                 )
@@ -26,7 +26,6 @@ from operator import itemgetter
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain.memory.chat_memory import BaseChatMemory
-from langchain.memory.summary import ConversationSummaryMemory
 from langchain_core.runnables import RunnablePassthrough
 from langchain.agents import create_tool_calling_agent, AgentExecutor
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
@@ -40,6 +39,9 @@ from langchain_core.messages.system import SystemMessage
 from .ai_agent import AIAgent
 from services.azure_mongodb import MongoDBClient
 from services.azure_form_recognizer import extract_text_from_file
+from services.past_summaries import select_past_summaries
+from services.chat_context import ChatContext, load_chat_context, activate_chat_context, deactivate_chat_context
+from services.chat_history import WindowedChatMessageHistory, chat_summarizer
 # Constants
 from utils.consts import SYSTEM_MESSAGE
 
@@ -76,13 +78,14 @@ class StudyBuddyAIAgent(AIAgent):
         self.desired_role = desired_role  # Store desired_role for later use
         # Format the system message with desired_role and AGENT_NAME
         formatted_system_message = system_message.format(role=desired_role)
+        self.formatted_system_message = formatted_system_message
         # Create a SystemMessage object
         self.system_message = SystemMessage(content=formatted_system_message)
         super().__init__(formatted_system_message, tool_names)
 
         # Define the base prompt messages without extracted_text
         self.base_prompt_messages = [
-            ("system", self.system_message.content),
+            SystemMessage(content=formatted_system_message),
             ("system", "{past_summaries}"),
             ("system", "You can retrieve information about the AI using the 'agent_facts' tool."),
             ("system", "You can generate suggestions using the 'generate_suggestions' tool."),
@@ -106,23 +109,31 @@ class StudyBuddyAIAgent(AIAgent):
 
         # Initialize the agent executor to None; it will be set in the run method
         self.agent_executor = None
+        # The database context of the current request, shared with the tools
+        self.chat_context = None
 
-    
+    def reset(self):
+        """
+        Clears the per-request state so that the agent can be reused by another request.
+        """
+        self.system_message = SystemMessage(content=self.formatted_system_message)
+        self.agent_executor = None
+        if self.chat_context is not None:
+            deactivate_chat_context(self.chat_context)
+            self.chat_context = None
 
-    def get_session_history(self, session_id: str) -> MongoDBChatMessageHistory:
+    def get_session_history(self, session_id: str) -> WindowedChatMessageHistory:
         """
         Retrieves the chat history for a given session ID from the database.
+        Only the most recent turns are loaded; older turns are replaced by a rolling summary.
 
         Args:
             session_id (str): The session ID to retrieve the chat history for.
         """
-        CONNECTION_STRING = MongoDBClient.get_mongodb_variables()
-
-        history = MongoDBChatMessageHistory(
-            CONNECTION_STRING,
+        history = WindowedChatMessageHistory(
             session_id,
-            MongoDBClient.get_db_name(),
-            collection_name="chat_turns"
+            collection_name="chat_turns",
+            llm=self.llm
         )
 
         logging.info(f"Retrieved chat history for session {history}")
@@ -194,9 +205,23 @@ class StudyBuddyAIAgent(AIAgent):
         return suggestions
 
     def get_user_mood(self, user_id, chat_id):
-        history:BaseChatMessageHistory = self.get_session_history(f"{user_id}-{chat_id}")
-        history_log = asyncio.run(history.aget_messages()) # Running async function as synchronous
+        history = self.get_session_history(f"{user_id}-{chat_id}")
+        history_log = history.get_recent_messages()
+
+        response = self._get_mood_chain().invoke({"messages": history_log})
+        return self._parse_user_mood(response)
+
+    async def aget_user_mood(self, user_id, chat_id):
+        history = self.get_session_history(f"{user_id}-{chat_id}")
+        history_log = await asyncio.to_thread(history.get_recent_messages)
+
+        response = await self._get_mood_chain().ainvoke({"messages": history_log})
+        return self._parse_user_mood(response)
 
+    def _get_mood_chain(self):
+        """
+        Builds the chain that describes the user's mood from the latest chat messages.
+        """
         # Get perceived mood
         instructions = """
         Given the messages provided, describe the user's mood in a single adjective. 
@@ -221,9 +246,10 @@ class StudyBuddyAIAgent(AIAgent):
             start_on="human",
         )
 
-        trimmer.invoke(history_log)
-        chain = RunnablePassthrough.assign(messages=itemgetter("messages") | trimmer) | prompt | self.llm
-        response = chain.invoke({"messages": history_log})
+        return RunnablePassthrough.assign(messages=itemgetter("messages") | trimmer) | prompt | self.llm
+
+    @staticmethod
+    def _parse_user_mood(response):
         user_mood = None if response.content == "None" else response.content
 
         print("The user is feeling: ", user_mood)
@@ -282,7 +308,7 @@ class StudyBuddyAIAgent(AIAgent):
         return most_recent_chat_summary.get("chat_id")
 
 
-    def run(self, message: str, file_content: bytes = None, file_mime_type: str = None, with_history:bool =True, user_id: str=None, chat_id:int=None, turn_id:int=None) -> str:
+    def run(self, message: str, file_content: bytes = None, file_mime_type: str = None, with_history:bool =True, user_id: str=None, chat_id:int=None, turn_id:int=None, chat_context: ChatContext=None, document_text: str=None) -> str:
         """
         Runs the agent with the given message and context.
 
@@ -293,27 +319,93 @@ class StudyBuddyAIAgent(AIAgent):
             user_id (str): A unique identifier for the user.
             chat_id (int): A unique identifier for the conversation.
             turn_id (int): A unique identifier for the evaluated turn in the conversation.
+            chat_context (ChatContext): The context already loaded for this request. Loaded here if omitted.
+            document_text (str): The text of a document extracted in the background. Used instead of `file_content`.
+        """
+        agent_input, config = self._prepare_invocation(message, file_content, file_mime_type, user_id, chat_context, document_text)
+
+        invocation = self.agent_executor.invoke(agent_input, config=config)
+
+        return self._format_response(invocation["output"])
+
+    async def arun(self, message: str, file_content: bytes = None, file_mime_type: str = None, with_history:bool =True, user_id: str=None, chat_id:int=None, turn_id:int=None, chat_context: ChatContext=None, document_text: str=None) -> str:
+        """
+        Runs the agent asynchronously with the given message and context.
+        Takes the same arguments as `run`.
+        """
+        # Database reads and file extraction are blocking, so they run in a worker thread
+        agent_input, config = await asyncio.to_thread(
+            self._prepare_invocation, message, file_content, file_mime_type, user_id, chat_context, document_text
+        )
+
+        invocation = await self.agent_executor.ainvoke(agent_input, config=config)
+
+        return self._format_response(invocation["output"])
+
+    async def astream(self, message: str, file_content: bytes = None, file_mime_type: str = None, with_history:bool =True, user_id: str=None, chat_id:int=None, turn_id:int=None, chat_context: ChatContext=None, document_text: str=None):
+        """
+        Runs the agent asynchronously and yields its progress as it happens.
+        Takes the same arguments as `run`.
+
+        Yields:
+            dict: `tool_start` and `tool_end` events for each tool call, `token` events for each
+            streamed completion chunk, and a final `done` event with the full response.
+        """
+        agent_input, config = await asyncio.to_thread(
+            self._prepare_invocation, message, file_content, file_mime_type, user_id, chat_context, document_text
+        )
+
+        output = None
+        # The history wrapper persists the turn when the outermost run ends
+        async for event in self.agent_executor.astream_events(agent_input, config=config, version="v2"):
+            kind = event["event"]
+
+            if kind == "on_tool_start":
+                yield {"type": "tool_start", "tool": event["name"], "input": event["data"].get("input")}
+            elif kind == "on_tool_end":
+                yield {"type": "tool_end", "tool": event["name"], "output": str(event["data"].get("output"))}
+            elif kind == "on_chat_model_stream":
+                content = event["data"]["chunk"].content
+                if content:
+                    yield {"type": "token", "content": content}
+            elif kind == "on_chain_end" and not event.get("parent_ids"):
+                output = event["data"].get("output", {}).get("output")
+
+        yield {"type": "done", "message": self._format_response(output)}
+
+    def _prepare_invocation(self, message: str, file_content: bytes, file_mime_type: str, user_id: str, chat_context: ChatContext = None, document_text: str = None) -> tuple[dict, dict]:
+        """
+        Loads the conversation context, builds the agent executor and returns the agent input and run config.
+
+        Args:
+            message (str): The message to be processed by the agent.
+            file_content (bytes): The content of the uploaded file.
+            file_mime_type (str): The MIME type of the uploaded file.
+            user_id (str): A unique identifier for the user.
+            chat_context (ChatContext): The context already loaded for this request. Loaded here if omitted.
+            document_text (str): The text of a document extracted in the background. Used instead of `file_content`.
         """
+        if chat_context is None:
+            chat_context = load_chat_context(user_id)
 
+        # Tools read the user's profile and journey from the context until the agent is reset
+        if self.chat_context is not None:
+            deactivate_chat_context(self.chat_context)
+        activate_chat_context(chat_context)
+        self.chat_context = chat_context
 
-        chat_id = StudyBuddyAIAgent.get_chat_id(user_id)
+        chat_id = chat_context.latest_chat_id
 
        
         # TODO: throw error if user_id, chat_id is set to None.
         session_id = f"{user_id}-{chat_id}"
        
-       # Retrieve past conversation summaries for the user
-        db_client = MongoDBClient.get_client()
-        db_name = MongoDBClient.get_db_name()
-        db = db_client[db_name]
-        chat_summary_collection = db["chat_summaries"]
-        past_summaries_cursor = chat_summary_collection.find({"user_id": user_id}).sort("chat_id", -1)
-        past_summaries = list(past_summaries_cursor)
-        summaries_text = "\n".join([summary.get("summary_text", "") for summary in past_summaries])
+       # Retrieve the past conversation summaries most relevant to the message, within a token budget
+        summaries_text = select_past_summaries(user_id, message, summaries=chat_context.summaries)
 
        # Process the uploaded file if provided
-        extracted_text = ""
-        if file_content and file_mime_type:
+        extracted_text = document_text or ""
+        if not extracted_text and file_content and file_mime_type:
             extracted_text = extract_text_from_file(file_content, file_mime_type)
             logging.info(f"Extracted text from file: {extracted_text[:500]}")
 
@@ -325,15 +417,7 @@ class StudyBuddyAIAgent(AIAgent):
             "agent_scratchpad": [],
         }
 
-        # Dynamically build the prompt messages
-        prompt_messages = self.base_prompt_messages.copy()
-
-        if extracted_text:
-            # Include the extracted text in the prompt with clear instruction
-            prompt_messages.insert(2, ("system", f"The user has provided a document with the following content:\n\n{extracted_text}\n\nPlease use this content to assist the user."))
-
-        # Create a ChatPromptTemplate with the prompt messages
-        prompt = ChatPromptTemplate.from_messages(prompt_messages)
+        prompt = self._build_prompt(extracted_text)
 
         # Create the agent with the new prompt
         agent = create_tool_calling_agent(self.llm, self.tools, prompt)
@@ -342,22 +426,36 @@ class StudyBuddyAIAgent(AIAgent):
         )
         self.agent_executor = self.get_agent_with_history(agent_executor)
 
-        try:
-            invocation = self.agent_executor.invoke(
-                agent_input,
-                config={"configurable": {"session_id": session_id}}
-            )
+        return agent_input, {"configurable": {"session_id": session_id}}
+
+    def _build_prompt(self, extracted_text: str = "") -> ChatPromptTemplate:
+        """
+        Builds the agent prompt from the current system message and the optional document text.
+
+        The system message and the document text are passed as messages rather than templates,
+        as past chat summaries and documents often contain braces (code, sets, JSON).
 
-            response = invocation["output"]
+        Args:
+            extracted_text (str): The text of the document provided with the message.
+        """
+        # Use the current system message, so that per-request addenda (e.g. from the initial greeting) are included
+        prompt_messages = self.base_prompt_messages.copy()
+        prompt_messages[0] = SystemMessage(content=self.system_message.content)
+
+        if extracted_text:
+            # Include the extracted text in the prompt with clear instruction
+            prompt_messages.insert(2, SystemMessage(content=f"The user has provided a document with the following content:\n\n{extracted_text}\n\nPlease use this content to assist the user."))
 
-            if isinstance(response, dict):
-                response = json.dumps(response)
-            elif not isinstance(response, str):
-                response = str(response)
+        return ChatPromptTemplate.from_messages(prompt_messages)
+
+    @staticmethod
+    def _format_response(response) -> str:
+        if isinstance(response, dict):
+            response = json.dumps(response)
+        elif not isinstance(response, str):
+            response = str(response)
 
-            return response
-        except Exception as e:
-            raise
+        return response
 
 
     def get_initial_greeting(self, user_id:str) -> dict:
@@ -367,6 +465,53 @@ class StudyBuddyAIAgent(AIAgent):
         Args:
             user_id (str): The unique identifier for the user.
         """
+        chat_id = self._start_chat(user_id)
+
+        response = self.run(
+            message="",
+            with_history=True,
+            user_id=user_id,
+            chat_id=chat_id,
+            turn_id=0,
+        )
+
+        return {
+            "message": response,
+            "chat_id": chat_id
+        }
+
+    async def aget_initial_greeting(self, user_id:str) -> dict:
+        """
+        Retrieves the initial greeting message for a user asynchronously.
+
+        Args:
+            user_id (str): The unique identifier for the user.
+        """
+        chat_id = await asyncio.to_thread(self._start_chat, user_id)
+
+        response = await self.arun(
+            message="",
+            with_history=True,
+            user_id=user_id,
+            chat_id=chat_id,
+            turn_id=0,
+        )
+
+        return {
+            "message": response,
+            "chat_id": chat_id
+        }
+
+    def _start_chat(self, user_id:str) -> int:
+        """
+        Creates the chat summary and user journey records for a new chat and prepares the system message.
+
+        Args:
+            user_id (str): The unique identifier for the user.
+
+        Returns:
+            int: The ID of the new chat.
+        """
         db_client = MongoDBClient.get_client()
         db_name = MongoDBClient.get_db_name()
         db = db_client[db_name]
@@ -376,12 +521,12 @@ class StudyBuddyAIAgent(AIAgent):
         user_journey = user_journey_collection.find_one({"user_id": user_id})
 
          # Retrieve past conversation summaries for the user
-        past_summaries_cursor = chat_summary_collection.find({"user_id": user_id}).sort("chat_id", -1)
-
-        past_summaries = list(past_summaries_cursor)
+        past_summaries_cursor = chat_summary_collection.find(
+            {"user_id": user_id}, {"summary_text": 1}
+        ).sort("chat_id", -1).limit(2)
 
         # Combine the past summaries into a single string
-        recent_summaries = past_summaries[:2]
+        recent_summaries = list(past_summaries_cursor)
         summaries_text = "\n".join([summary.get("summary_text", "") for summary in recent_summaries])
         print(f"Past summaries retrieved:\n{summaries_text}")
 
@@ -429,68 +574,45 @@ class StudyBuddyAIAgent(AIAgent):
             full_system_message = ''.join([system_message.content, introduction])
             system_message.content = full_system_message
 
-        chat_id = StudyBuddyAIAgent.get_chat_id(user_id)
-
-        response = self.run(
-            message="",
-            with_history=True,
-            user_id=user_id,
-            chat_id=chat_id,
-            turn_id=0,
-        )
-
-        return {
-            "message": response,
-            "chat_id": chat_id
-        }
+        return StudyBuddyAIAgent.get_chat_id(user_id)
         
         
 
     def get_summary_from_chat_history(self, user_id, chat_id):
-        history: BaseChatMessageHistory = self.get_session_history(f"{user_id}-{chat_id}")
-
-        memory = ConversationSummaryMemory(
-            llm=self.llm,
-            chat_memory=history,
-            return_messages=False,
-            input_key='input',
-            output_key='output'
-        )
+        """
+        Returns the summary of a whole chat.
+
+        The rolling summary already covers most turns, so finalizing only folds in the
+        turns added since its last update, with at most one model call.
+        """
+        history = self.get_session_history(f"{user_id}-{int(chat_id)}")
+        summary = chat_summarizer.update(history, self.llm, keep_recent_turns=0, min_new_turns=0)
 
-        messages = asyncio.run(history.aget_messages())
-
-        # Process messages in pairs (HumanMessage and AIMessage)
-        for i in range(0, len(messages), 2):
-            if i + 1 < len(messages):
-                human_msg = messages[i]
-                ai_msg = messages[i + 1]
-
-                if isinstance(human_msg, HumanMessage) and not isinstance(ai_msg, HumanMessage):
-                    memory.save_context({'input': human_msg.content}, {'output': ai_msg.content})
-                else:
-                    # Handle mismatched pairs if necessary
-                    pass
-            else:
-                # Handle the case where there's an unmatched message at the end
-                pass
-
-        # Retrieve the summary
-        summary = memory.load_memory_variables({}).get('history', '')
         print(f"Generated summary: {summary}")
         return summary
 
 
 
     def perform_final_processes(self, user_id, chat_id):
+        mood = self.get_user_mood(user_id, chat_id)
+        summary = self.get_summary_from_chat_history(user_id, chat_id)
+
+        self._save_chat_summary(user_id, chat_id, mood, summary)
+
+    async def aperform_final_processes(self, user_id, chat_id):
+        mood = await self.aget_user_mood(user_id, chat_id)
+        summary = await asyncio.to_thread(self.get_summary_from_chat_history, user_id, chat_id)
+
+        await asyncio.to_thread(self._save_chat_summary, user_id, chat_id, mood, summary)
+
+    @staticmethod
+    def _save_chat_summary(user_id, chat_id, mood, summary):
         db_client = MongoDBClient.get_client()
         db_name = MongoDBClient.get_db_name()
         db = db_client[db_name]
 
         chat_summary_collection = db["chat_summaries"]
 
-        mood = self.get_user_mood(user_id, chat_id)
-        summary = self.get_summary_from_chat_history(user_id, chat_id)
-
         # Update the chat summary
         result = chat_summary_collection.update_one(
             {"user_id": user_id, "chat_id": int(chat_id)}, 
@@ -498,4 +620,3 @@ class StudyBuddyAIAgent(AIAgent):
         )
 
         print(result)
-        pass
\ No newline at end of file
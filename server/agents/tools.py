@@ -5,8 +5,7 @@ from langchain_community.tools.tavily_search import TavilySearchResults
 from services.db.user import get_user_profile_by_user_id
 from services.db.user_journey import get_user_journey_by_user_id
 from langchain.tools import Tool
-from utils.agents import get_job_listings,get_google_search_results,get_gutendex_domain_textbooks, get_public_domain_textbooks, get_youtube_search_results, generate_suggestions, generate_document
-from langchain_google_community import GooglePlacesTool
+from utils.agents import get_job_listings,get_google_places_tool,get_google_search_results,get_gutendex_domain_textbooks, get_public_domain_textbooks, get_youtube_search_results, generate_suggestions, generate_document
 from .tool_schemas import (
     GenerateDocumentInput,
     UserProfileRetrievalInput,
@@ -25,12 +24,13 @@ from .tool_schemas import (
 toolbox = {
     "community": {
         "web_search_tavily": TavilySearchResults(),
-        "location_search_gplaces": GooglePlacesTool(),
+        "location_search_gplaces": get_google_places_tool(),
     },
     "custom": {
         "agent_facts": {
             "description": "Searches for specific facts about the AI's origin, creators, capabilities, and history.",
             "retriever": True,
+            "in_memory_index": True,
             "structured": True,
             "args_schema": AgentFactsInput,
         },
@@ -45,6 +45,8 @@ toolbox = {
             "description": "Uses Google Custom Search to fetch search results for a given query.",
             "retriever": False,
             "structured": True,
+            "timeout": 15,
+            "cache_ttl": 24 * 60 * 60,
             "args_schema": WebSearchGoogleInput
         },
         "web_search_youtube": {
@@ -52,6 +54,8 @@ toolbox = {
             "description": "Uses YouTube Search to fetch search results for a given query.",
             "retriever": False,
             "structured": True,
+            "timeout": 15,
+            "cache_ttl": 24 * 60 * 60,
             "args_schema": WebSearchYouTubeInput
         },
         "user_profile_retrieval": {
@@ -74,24 +78,31 @@ toolbox = {
             "func": get_public_domain_textbooks,
              "description": "Searches for textbooks in public domain or open-access libraries based on the user's query. Provides direct PDF links if available.",
             "structured": True,
+            "timeout": 20,
+            "cache_ttl": 24 * 60 * 60,
             "args_schema": TextbookSearchInput
         },
          "gutendex_textbook_search": {
             "func": get_gutendex_domain_textbooks,
             "description": "Searches OpenStax for open-access textbooks based on the user's query. Provides direct PDF download links.",
             "structured": True,
+            "timeout": 20,
+            "cache_ttl": 24 * 60 * 60,
             "args_schema": TextbookSearchInput
         },
         "generate_document": {
         "func": generate_document,
         "description": "Generates a document (PDF or DOCX) with the given content and returns a link to download it.",
         "structured": True,
+        "timeout": 30,
         "args_schema": GenerateDocumentInput
         },
          "job_search": {
             "func": get_job_listings,
             "description": "Fetches current job listings that match the user's skills and optional location.",
             "structured": True,
+            "timeout": 15,
+            "cache_ttl": 60 * 60,
             "args_schema": JobSearchInput,
         },
     }
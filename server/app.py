@@ -11,15 +11,47 @@ from flask_cors import CORS
 from config.config import Config
 from flask_jwt_extended import JWTManager
 from routes import register_blueprints
+from services.azure_mongodb import MongoDBClient
 from services.db.agent_facts import load_agent_facts_to_db
+from services.vector_store_registry import vector_store_registry
+from agents.tools import toolbox
+from agents.ai_agent import in_memory_indexes
 from flask_apscheduler import APScheduler
 from utils.delete_generated_doc import delete_old_files_job
+from utils.metrics import collect_metrics
+from utils.disk_cache import prune_disk_caches_job
 import logging  
+import socket
+from utils.consts import SOCKET_DEFAULT_TIMEOUT_SECONDS
 
 """ Load environment variables """
 load_dotenv()
 
+# Clients that set no socket timeout of their own would otherwise hold a tool thread forever
+socket.setdefaulttimeout(SOCKET_DEFAULT_TIMEOUT_SECONDS)
+
 """ Step 2: Define the run_app function """
+def prepare_database():
+    """
+    Creates the required indexes, loads the agent facts, syncs the vector stores and loads
+    the in-memory indexes. Runs whenever the app is built, so that WSGI deployments get the
+    indexes too and the first tool call does not wait for a vector store build.
+    """
+    try:
+        MongoDBClient.ensure_indexes(MongoDBClient.get_client()[MongoDBClient.get_db_name()])
+        load_agent_facts_to_db()
+
+        retrievers = {tool_name: tool_dict for tool_name, tool_dict in toolbox["custom"].items() if tool_dict.get("retriever", False)}
+        vector_store_registry.warm(list(retrievers))
+        # Retrievers with an in-memory index (e.g. agent_facts) load their synced vector store into memory
+        for tool_name, tool_dict in retrievers.items():
+            if tool_dict.get("in_memory_index", False):
+                in_memory_indexes[tool_name].warm()
+    except Exception as e:
+        # The app can serve without them; the indexes are created again on the next start
+        logging.error(f"Failed to prepare the database: {e}", exc_info=True)
+
+
 def run_app():
     
     app = Flask(__name__)
@@ -63,6 +95,14 @@ def run_app():
         Health probe endpoint.
         """    
         return {"status": "ready"}
+
+    # Metrics endpoint
+    @app.get("/metrics")
+    def metrics():
+        """
+        Reports cache, pool and client metrics.
+        """
+        return collect_metrics()
     
     
     # Initialize APScheduler
@@ -77,18 +117,29 @@ def run_app():
         hour=0, minute=0  # Run daily at midnight
     )
 
+    # Schedule the prune_disk_caches_job function
+    scheduler.add_job(
+        id='Prune Disk Caches',
+        func=prune_disk_caches_job,
+        trigger='cron',
+        minute=30  # Run hourly at half past, as the size bounds are only enforced here
+    )
+
     scheduler.start()
 
+    # DB pre-load
+    prepare_database()
+
     return app, jwt, mail
 
 
 """ Step 3: Run the app """
-app, jwt, mail = run_app()
+# Document extraction workers import this module as __mp_main__ when they start; only the server process builds the app
+if __name__ != "__mp_main__":
+    app, jwt, mail = run_app()
 
 """ Step 4: Start the server """
 if __name__ == '__main__':
     HOST = os.getenv("FLASK_RUN_HOST") or "0.0.0.0"
     PORT = os.getenv("FLASK_RUN_PORT") or 8000
-    # DB pre-load
-    load_agent_facts_to_db()
     app.run(debug=True, host=HOST, port=PORT)
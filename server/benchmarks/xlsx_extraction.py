@@ -0,0 +1,69 @@
+"""
+This module benchmarks text extraction from large .xlsx workbooks, to check that the
+cost per row stays flat as workbooks grow.
+
+Usage:
+    python -m benchmarks.xlsx_extraction --rows 100000
+"""
+
+"""Step 1: Import necessary modules"""
+# -- Standard libraries --
+import argparse
+import time
+from io import BytesIO
+# -- 3rd Party libraries --
+import openpyxl
+
+# -- Custom modules --
+from services.azure_form_recognizer import extract_text_from_xlsx
+
+
+"""Step 2: Define the benchmark helpers"""
+def build_workbook(rows: int, columns: int) -> bytes:
+    """
+    Builds a workbook with one sheet of mixed text and number cells.
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Data")
+    for row in range(rows):
+        sheet.append([f"student {row}" if column % 2 == 0 else row * column for column in range(columns)])
+
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def time_extraction(file_content: bytes, repeats: int) -> tuple[float, int]:
+    """
+    Returns the best extraction time out of `repeats` runs and the number of extracted characters.
+    """
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        # The row and character limits are lifted so that every row is parsed
+        text = extract_text_from_xlsx(file_content, max_rows_per_sheet=None, max_chars=None)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(text)
+
+
+"""Step 3: Define the command line entry point"""
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark .xlsx text extraction at growing row counts.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows of the largest workbook (default: 100000).")
+    parser.add_argument("--columns", type=int, default=10, help="Columns per row (default: 10).")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per size; the best is reported (default: 3).")
+    args = parser.parse_args(argv)
+
+    # Each size doubles up to the largest one, so a flat cost per row shows linear scaling
+    sizes = sorted({max(args.rows // 8, 1), max(args.rows // 4, 1), max(args.rows // 2, 1), args.rows})
+
+    print(f"{'rows':>10} {'seconds':>10} {'us/row':>10} {'chars':>12}")
+    for rows in sizes:
+        file_content = build_workbook(rows, args.columns)
+        seconds, chars = time_extraction(file_content, args.repeats)
+        print(f"{rows:>10} {seconds:>10.3f} {seconds / rows * 1e6:>10.2f} {chars:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,6 @@
 """This module defines the User model, which represents a user in the system."""
 """ Step 1: Import required libraries """
 from pydantic import BaseModel, EmailStr, Field, field_validator, validator
-from services.azure_mongodb import MongoDBClient
-from bson import ObjectId
 from email_validator import validate_email, EmailNotValidError
 from typing import Optional
 
@@ -48,43 +46,29 @@ class User(BaseModel):
         except EmailNotValidError as e:
             raise ValueError(str(e))
 
+    # The lookups below delegate to the user repository, which reads only the fields each use case needs.
+    # It is imported where used because the repository builds instances of this model.
+
     # Define a class method to find a user by username
     @classmethod
     def find_by_username(cls, username):
-        db_client = MongoDBClient.get_client()
-        db = db_client[MongoDBClient.get_db_name()]
-        user_data = db.users.find_one({"username": username})  # 'users' is the collection name
-        if user_data:
-            user_data['id'] = str(user_data['_id'])
-            return cls(**user_data)
-        return None
+        from services.db.user_repository import user_repository
+        return user_repository.find_by_username(username)
     
-    # Define a class method to find a user by email
+    # Define a class method to update a user's password
     @classmethod
     def update_password(cls, username, new_hashed_password):
-        db_client = MongoDBClient.get_client()
-        db = db_client[MongoDBClient.get_db_name()]
-        result = db.users.update_one({"username": username}, {"$set": {"password": new_hashed_password}})
-        return result.modified_count == 1
+        from services.db.user_repository import user_repository
+        return user_repository.update_password(username, new_hashed_password)
     
     # Define a class method to find a user by ID
     @classmethod
     def find_by_id(cls, user_id):
-        db_client = MongoDBClient.get_client()
-        db = db_client[MongoDBClient.get_db_name()]
-        user_data = db.users.find_one({"_id": ObjectId(user_id)})
-        if user_data:
-            user_data['id'] = str(user_data['_id'])
-            return cls(**user_data)
-        return None
+        from services.db.user_repository import user_repository
+        return user_repository.find_by_id(user_id)
     
     # Define a class method to find a user by email
     @classmethod
     def find_by_email(cls, email):
-        db_client = MongoDBClient.get_client()
-        db = db_client[MongoDBClient.get_db_name()]
-        user_data = db.users.find_one({"email": email})
-        if user_data:
-            user_data['id'] = str(user_data['_id'])
-            return cls(**user_data)
-        return None
\ No newline at end of file
+        from services.db.user_repository import user_repository
+        return user_repository.find_by_email(email)
@@ -2,15 +2,18 @@
 
 """Step 1: Import necessary modules"""
 import logging
-from flask import jsonify, Blueprint, request, send_file, send_from_directory
+from flask import jsonify, Blueprint, request, send_file, send_from_directory, Response, stream_with_context
 import json
 from services.speech_service import speech_to_text
-from agents.study_buddy_agent import StudyBuddyAIAgent
+from agents.agent_pool import study_buddy_agent_pool
 from services.azure_mongodb import MongoDBClient
+from services.chat_context import load_chat_context
 import io
 from services.text_to_speech_service import text_to_speech
 import filetype
 from services.azure_form_recognizer import ALLOWED_MIME_TYPES
+from services.document_extraction_jobs import JOB_COMPLETED, JOB_FAILED, document_extraction_jobs
+from utils.streaming import format_sse, iterate_async_generator
 
 """Step 2: Create a Blueprint object"""
 # Configure logging
@@ -19,9 +22,140 @@ logger = logging.getLogger(__name__)
 
 ai_routes = Blueprint("ai", __name__)
 
+# Tool sets used by the AI Mentor endpoints; agents are pooled per (role, tool set)
+WELCOME_TOOL_NAMES = [
+    "gutendex_textbook_search",
+    "generate_suggestions",
+    "web_search_youtube",
+    "web_search_tavily",
+    "textbook_search",
+    "location_search_gplaces",
+    "web_search_google",
+    "user_profile_retrieval",
+    "agent_facts"
+]
+
+CHAT_TOOL_NAMES = [
+    "gutendex_textbook_search",
+    "generate_suggestions",
+    "web_search_youtube",
+    "web_search_google",
+    "web_search_tavily",
+    "location_search_gplaces",
+    "textbook_search",
+    "user_profile_retrieval",
+    "agent_facts",
+    "user_journey_retrieval",
+    "generate_document",
+    "job_search"
+]
+
+FINALIZE_TOOL_NAMES = WELCOME_TOOL_NAMES
+
+
+
+"""Step 3: Define the route helpers"""
+
+def read_uploaded_file():
+    """
+    Reads and validates the optional file uploaded with a chat message.
+
+    Returns:
+        tuple: (file content, MIME type, error response). The error response is None if the upload is valid.
+    """
+    # Check for file in the request
+    uploaded_file = request.files.get('file')
+
+    # Handle the uploaded file
+    file_content = None
+    file_mime_type = None
+    if uploaded_file:
+        # Read the file content
+        file_content = uploaded_file.read()
+
+        # Detect the file type using 'filetype'
+        kind = filetype.guess(file_content)
+        if kind is None:
+            return None, None, (jsonify({'error': 'Cannot guess the file type'}), 400)
+
+        file_mime_type = kind.mime
+
+        print(f"allowed mime types: {ALLOWED_MIME_TYPES}")
+        if file_mime_type not in ALLOWED_MIME_TYPES:
+            return None, None, (jsonify({'error': f'Unsupported file type: {file_mime_type}'}), 400)
+
+        # Implement file size check
+        MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
+        if len(file_content) > MAX_FILE_SIZE:
+            return None, None, (jsonify({'error': 'File size exceeds the maximum limit of 10 MB'}), 400)
 
+    return file_content, file_mime_type, None
 
-"""Step 3: Define the routes"""
+
+def submit_uploaded_file(user_id):
+    """
+    Starts extracting the optional uploaded file in the background.
+
+    Returns:
+        tuple: (job, error response). The job is None if no file was uploaded.
+    """
+    file_content, file_mime_type, error = read_uploaded_file()
+    if error or file_content is None:
+        return None, error
+
+    try:
+        return document_extraction_jobs.submit(file_content, file_mime_type, user_id), None
+    except Exception as e:
+        logger.error(f"Failed to start extracting a document: {str(e)}")
+        return None, (jsonify({'error': 'Failed to start processing the document'}), 500)
+
+
+def read_chat_document_text(user_id, body):
+    """
+    Reads the text of the document of a chat turn, which is either uploaded with the turn or
+    referenced by the `document_id` form field. Uploaded files are extracted in the background,
+    so unless their text is already available the turn is answered with their `document_id`.
+
+    Returns:
+        tuple: (document text, error response). The text is None if the turn has no document.
+    """
+    job, error = submit_uploaded_file(user_id)
+    if error:
+        return None, error
+    if job is not None:
+        if job["status"] != JOB_COMPLETED:
+            return None, (jsonify({
+                **job,
+                'error': 'The document is being processed. Send the message again with this document_id once it is completed.',
+            }), 202)
+        body = {**body, "document_id": job["document_id"]}
+
+    return read_document_text(user_id, body)
+
+
+def read_document_text(user_id, body):
+    """
+    Reads the text of the document referenced by the optional `document_id` form field.
+
+    Returns:
+        tuple: (document text, error response). The text is None if no document is referenced.
+    """
+    document_id = body.get("document_id")
+    if not document_id:
+        return None, None
+
+    text, job = document_extraction_jobs.get_text(document_id, user_id)
+    if job is None:
+        return None, (jsonify({'error': 'Document not found'}), 404)
+    if job["status"] == JOB_FAILED:
+        return None, (jsonify({'error': 'Text extraction failed for this document', 'status': JOB_FAILED}), 422)
+    if job["status"] != JOB_COMPLETED:
+        return None, (jsonify({'error': 'Document is still being processed', 'status': job["status"]}), 409)
+
+    return text, None
+
+
+"""Step 4: Define the routes"""
 
 # Define the route for the initial greeting with role input
 @ai_routes.post("/ai_mentor/welcome/<user_id>")
@@ -32,22 +166,9 @@ def get_mental_health_agent_welcome(user_id):
     
     desired_role = body.get("role", "educational mentor")  # Default to 'educational mentor' if not specified
 
-    agent = StudyBuddyAIAgent(
-        tool_names=[
-            "gutendex_textbook_search",
-            "generate_suggestions",
-            "web_search_youtube",
-            "web_search_tavily",
-            "textbook_search",
-            "location_search_gplaces",
-            "web_search_google",
-            "user_profile_retrieval",
-            "agent_facts"
-        ],
-        desired_role=desired_role  # Pass the desired role to the agent
-    )
-
-    response = agent.get_initial_greeting(user_id=user_id)
+    # Borrow a warm agent for the desired role from the pool
+    with study_buddy_agent_pool.checkout(desired_role, WELCOME_TOOL_NAMES) as agent:
+        response = agent.get_initial_greeting(user_id=user_id)
 
     if response is None:
         logger.error(f"No greeting found for user {user_id}")
@@ -57,6 +178,37 @@ def get_mental_health_agent_welcome(user_id):
 
 
 
+# Define the route for uploading a document to be extracted in the background
+@ai_routes.post("/ai_mentor/<user_id>/documents")
+def upload_document(user_id):
+    """
+    Starts extracting the text of an uploaded document and returns its `document_id`.
+
+    The chat endpoints accept the `document_id` form field in place of the file once
+    the status endpoint reports the document as `completed`.
+    """
+    job, error = submit_uploaded_file(user_id)
+    if error:
+        return error
+    if job is None:
+        return jsonify({'error': 'File is required'}), 400
+
+    return jsonify(job), 200 if job["status"] == JOB_COMPLETED else 202
+
+
+
+# Define the route for checking the extraction status of an uploaded document
+@ai_routes.get("/ai_mentor/<user_id>/documents/<document_id>")
+def get_document_status(user_id, document_id):
+    job = document_extraction_jobs.get_status(document_id, user_id)
+    if job is None:
+        return jsonify({'error': 'Document not found'}), 404
+
+    job["document_id"] = job.pop("_id")
+    return jsonify(job), 200
+
+
+
 # Define the route for the main conversation
 @ai_routes.post("/ai_mentor/<user_id>/<chat_id>")
 def run_mental_health_agent(user_id, chat_id):
@@ -67,70 +219,27 @@ def run_mental_health_agent(user_id, chat_id):
     prompt = body.get("prompt")
     turn_id = int(body.get("turn_id", 0))
 
-    # Check for file in the request
-    uploaded_file = request.files.get('file')
-
-    # Handle the uploaded file
-    file_content = None
-    file_mime_type = None
-    if uploaded_file:
-        # Read the file content
-        file_content = uploaded_file.read()
-
-        # Detect the file type using 'filetype'
-        kind = filetype.guess(file_content)
-        if kind is None:
-            return jsonify({'error': 'Cannot guess the file type'}), 400
-
-        file_extension = kind.extension
-        file_mime_type = kind.mime
-
-        print(f"allowed mime types: {ALLOWED_MIME_TYPES}")
-        if file_mime_type not in ALLOWED_MIME_TYPES:
-            return jsonify({'error': f'Unsupported file type: {file_mime_type}'}), 400
+    # Documents are extracted in the background and referenced by ID, never extracted inline
+    document_text, error = read_chat_document_text(user_id, body)
+    if error:
+        return error
 
-        # Implement file size check
-        MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
-        if len(file_content) > MAX_FILE_SIZE:
-            return jsonify({'error': 'File size exceeds the maximum limit of 10 MB'}), 400
-
-    # Retrieve desired_role from the database
-    db_client = MongoDBClient.get_client()
-    db_name = MongoDBClient.get_db_name()
-    db = db_client[db_name]
-    chat_summary_collection = db["chat_summaries"]
-    chat_summary = chat_summary_collection.find_one({"user_id": user_id, "chat_id": int(chat_id)})
-    desired_role = chat_summary.get("desired_role", "educational mentor")
+    # Load the role, summaries, profile and journey of the chat in one batch
+    chat_context = load_chat_context(user_id, int(chat_id))
+    desired_role = chat_context.desired_role
     print(f"Desired role: {desired_role}")
-    agent = StudyBuddyAIAgent(
-        tool_names=[
-            "gutendex_textbook_search",
-            "generate_suggestions",
-            "web_search_youtube",
-            "web_search_google",
-            "web_search_tavily",
-            "location_search_gplaces",
-            "textbook_search",
-            "user_profile_retrieval",
-            "agent_facts",
-            "user_journey_retrieval",
-            "generate_document",
-            "job_search"
-        ],
-        desired_role=desired_role  
-    )
 
     try:
-            
-        response = agent.run(
-                                file_content=file_content,
-                                file_mime_type=file_mime_type,
-                                message=prompt,
-                                with_history=True,
-                                user_id=user_id,
-                                chat_id=int(chat_id),
-                                turn_id=turn_id + 1, 
-                            )
+        with study_buddy_agent_pool.checkout(desired_role, CHAT_TOOL_NAMES) as agent:
+            response = agent.run(
+                                    message=prompt,
+                                    with_history=True,
+                                    user_id=user_id,
+                                    chat_id=int(chat_id),
+                                    turn_id=turn_id + 1, 
+                                    chat_context=chat_context,
+                                    document_text=document_text,
+                                )
 
         return jsonify(response), 200
     except json.JSONDecodeError as e:
@@ -142,14 +251,62 @@ def run_mental_health_agent(user_id, chat_id):
 
 
 
+# Define the route for the main conversation, streamed as server-sent events
+@ai_routes.post("/ai_mentor/<user_id>/<chat_id>/stream")
+def stream_mental_health_agent(user_id, chat_id):
+    """
+    Streams tool-call events and the answer tokens of a chat turn as server-sent events.
+
+    Events are JSON objects with a `type` of `tool_start`, `tool_end`, `token`, `done` or `error`.
+    The chat history is persisted once the agent run completes.
+    """
+    body = request.form.to_dict()
+    if not body:
+        return jsonify({"error": "No data provided"}), 400
+
+    prompt = body.get("prompt")
+    turn_id = int(body.get("turn_id", 0))
+
+    document_text, error = read_chat_document_text(user_id, body)
+    if error:
+        return error
+
+    chat_context = load_chat_context(user_id, int(chat_id))
+    desired_role = chat_context.desired_role
+
+    def generate():
+        with study_buddy_agent_pool.checkout(desired_role, CHAT_TOOL_NAMES) as agent:
+            try:
+                events = agent.astream(
+                    message=prompt,
+                    with_history=True,
+                    user_id=user_id,
+                    chat_id=int(chat_id),
+                    turn_id=turn_id + 1,
+                    chat_context=chat_context,
+                    document_text=document_text,
+                )
+                for event in iterate_async_generator(events):
+                    yield format_sse(event)
+            except Exception as e:
+                logger.error(f"Unexpected error while streaming: {str(e)}")
+                yield format_sse({"type": "error", "error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+
 # Define the route for finalizing the conversation
 @ai_routes.patch("/ai_mentor/finalize/<user_id>/<chat_id>")
 def set_mental_health_end_state(user_id, chat_id):
     try:
         logger.info(f"Finalizing chat {chat_id} for user {user_id}")
-        agent = StudyBuddyAIAgent(tool_names=["gutendex_textbook_search","generate_suggestions","web_search_youtube","web_search_tavily","textbook_search","location_search_gplaces", "web_search_google", "user_profile_retrieval", "agent_facts"])
-
-        agent.perform_final_processes(user_id, chat_id)
+        with study_buddy_agent_pool.checkout("educational mentor", FINALIZE_TOOL_NAMES) as agent:
+            agent.perform_final_processes(user_id, chat_id)
 
         # Potentially update the database or perform other cleanup operations
         # For now, let's assume it's a simple response:
@@ -10,6 +10,7 @@ from datetime import timedelta
 from werkzeug.security import generate_password_hash, check_password_hash
 from services.azure_mongodb import MongoDBClient
 from models.user import User as UserModel
+from services.db.user_repository import user_repository
 from dotenv import load_dotenv
 from pydantic import ValidationError
 from email_validator import validate_email, EmailNotValidError
@@ -37,22 +38,17 @@ def signup():
 
         user = UserModel(**user_data)
 
-        db_client = MongoDBClient.get_client()
-        db = db_client[MongoDBClient.get_db_name()]
-        
         # Check if user already exists with the same username or email
         logging.info("Checking for existing users")
-        existing_user = db['users'].find_one({"$or": [{"username": user.username}, {"email": user.email}]})
-        if existing_user:
+        if user_repository.exists(user.username, user.email):
             logging.info("User already exists")
             return jsonify({"error": "User with this username or email already exists"}), 409
         
         hashed_password = generate_password_hash(user.password)
         user_data['password'] = hashed_password
-        result = db['users'].insert_one(user_data)
-        if result:
+        user_id = user_repository.insert(user_data)
+        if user_id:
             logging.info("User registration successful")
-            user_id = result.inserted_id
             access_token = create_access_token(identity=str(user_id), expires_delta=timedelta(hours=72))
 
             return jsonify({"message": "User registered successfully", "access_token": access_token, "userId": str(user_id)}), 201
@@ -175,10 +171,7 @@ def google_callback():
                 'google_id': google_id,
                 # Add other fields if necessary
             }
-            db_client = MongoDBClient.get_client()
-            db = db_client[MongoDBClient.get_db_name()]
-            result = db['users'].insert_one(user_data)
-            user_id = result.inserted_id
+            user_id = user_repository.insert(user_data)
         else:
             user_id = user.id
 
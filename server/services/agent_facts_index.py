@@ -0,0 +1,164 @@
+"""
+This module keeps the agent facts and their embeddings in memory, so that the
+`agent_facts` tool can be answered with a local cosine similarity search instead
+of a Cosmos DB vector search.
+"""
+
+"""Step 1: Import necessary modules"""
+# -- Standard libraries --
+import logging
+import threading
+# -- 3rd Party libraries --
+import numpy as np
+from cachetools import LRUCache
+from langchain.schema import Document
+
+# -- Custom modules --
+from services.azure_mongodb import MongoDBClient
+from services.azure_open_ai import get_query_embedding, normalize_query
+from services.vector_store_indexer import (
+    get_vector_store_name,
+    VECTOR_STORE_EMBEDDING_KEY,
+    VECTOR_STORE_HASH_KEY,
+    VECTOR_STORE_TEXT_KEY,
+)
+from services.vector_store_registry import vector_store_registry
+from utils.consts import AGENT_FACTS_ANSWER_CACHE_SIZE
+from utils.docs import format_docs
+from utils.metrics import register_metrics_source
+
+
+"""Step 2: Define the InMemoryFactIndex class"""
+class InMemoryFactIndex:
+    """
+    An in-memory copy of a small, static vector store.
+
+    Document embeddings are held as a row-normalized NumPy matrix, so a search is a
+    single matrix-vector product. Formatted answers are cached per normalized query,
+    and query embeddings go through the shared query embedding cache.
+    """
+
+    def __init__(self, collection_name: str):
+        """
+        Initializes an InMemoryFactIndex object.
+
+        Args:
+            collection_name (str): The name of the source collection.
+        """
+        self.collection_name = collection_name
+        self._documents = None
+        self._matrix = None
+        self._answers = LRUCache(maxsize=AGENT_FACTS_ANSWER_CACHE_SIZE)
+        self._lock = threading.Lock()
+        self.answer_hits = 0
+        self.answer_misses = 0
+
+    def _load(self):
+        """
+        Loads the documents and their embeddings from the collection's vector store.
+        """
+        # Make sure the vector store has been built from the source collection
+        vector_store_registry.get_vector_store(self.collection_name)
+
+        db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
+        cursor = db[get_vector_store_name(self.collection_name)].find({}, {"_id": 0})
+
+        documents = []
+        vectors = []
+        for doc in cursor:
+            vector = doc.pop(VECTOR_STORE_EMBEDDING_KEY, None)
+            text = doc.pop(VECTOR_STORE_TEXT_KEY, "")
+            if not vector or not text:
+                continue
+            doc.pop(VECTOR_STORE_HASH_KEY, None)
+            documents.append(Document(page_content=text, metadata=doc))
+            vectors.append(vector)
+
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+
+        self._documents = documents
+        self._matrix = matrix / norms
+        logging.info(f"Loaded {len(documents)} documents into the in-memory '{self.collection_name}' index.")
+
+    def warm(self):
+        """
+        Loads the documents and their embeddings ahead of the first query.
+        """
+        with self._lock:
+            if self._matrix is None:
+                self._load()
+
+    def search(self, query: str, top_k: int = 3) -> list[Document]:
+        """
+        Returns the documents most similar to the query by cosine similarity.
+
+        Args:
+            query (str): The search query.
+            top_k (int): The number of documents to return.
+        """
+        with self._lock:
+            if self._matrix is None:
+                self._load()
+            documents, matrix = self._documents, self._matrix
+
+        if not documents:
+            return []
+
+        query_vector = np.asarray(get_query_embedding(query), dtype=np.float32)
+        query_norm = np.linalg.norm(query_vector)
+        if query_norm == 0:
+            return []
+
+        scores = matrix @ (query_vector / query_norm)
+        top_k = min(top_k, len(documents))
+        top_indices = np.argpartition(-scores, top_k - 1)[:top_k]
+        top_indices = top_indices[np.argsort(-scores[top_indices])]
+        return [documents[i] for i in top_indices]
+
+    def answer(self, query: str, top_k: int = 3) -> str:
+        """
+        Returns the formatted top-k documents for a query, reusing answers to repeated queries.
+
+        Args:
+            query (str): The search query.
+            top_k (int): The number of documents to return.
+        """
+        key = (normalize_query(query), top_k)
+        with self._lock:
+            cached_answer = self._answers.get(key)
+            if cached_answer is not None:
+                self.answer_hits += 1
+                return cached_answer
+            self.answer_misses += 1
+
+        answer = format_docs(self.search(query, top_k))
+
+        with self._lock:
+            self._answers[key] = answer
+        return answer
+
+    def invalidate(self):
+        """
+        Drops the loaded documents and cached answers after the source collection changed.
+        """
+        with self._lock:
+            self._documents = None
+            self._matrix = None
+            self._answers.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.answer_hits + self.answer_misses
+            return {
+                "documents": len(self._documents) if self._documents is not None else 0,
+                "answer_hits": self.answer_hits,
+                "answer_misses": self.answer_misses,
+                "answer_hit_rate": (self.answer_hits / lookups) if lookups else 0.0,
+            }
+
+
+"""Step 3: Create the agent facts index"""
+agent_facts_index = InMemoryFactIndex("agent_facts")
+register_metrics_source("agent_facts_index", agent_facts_index.stats)
@@ -2,7 +2,10 @@
 
 """Step 1: Import necessary modules"""
 import os
+import hashlib
 import logging
+import threading
+from cachetools import LRUCache
 from azure.ai.formrecognizer import DocumentAnalysisClient
 from azure.core.credentials import AzureKeyCredential
 from io import BytesIO
@@ -12,6 +15,24 @@ from docx import Document as DocxDocument
 import openpyxl
 from pptx import Presentation
 
+# pypdf reads the text layer of born-digital PDFs locally; without it every PDF goes to Form Recognizer
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+from utils.consts import (
+    EXTRACTION_CACHE_MEMORY_CHARS,
+    EXTRACTION_CACHE_DISK_MAX_BYTES,
+    EXTRACTION_CACHE_TTL_SECONDS,
+    EXTRACTION_MAX_CHARS,
+    PDF_MIN_TEXT_CHARS_PER_PAGE,
+    XLSX_MAX_COLUMNS,
+    XLSX_MAX_ROWS_PER_SHEET,
+)
+from utils.disk_cache import DiskCache
+from utils.metrics import register_metrics_source
+
 """Step 2: Define the helper functions"""
 # Define a function to get the Form Recognizer client
 def get_form_recognizer_client():
@@ -20,80 +41,298 @@ def get_form_recognizer_client():
     return DocumentAnalysisClient(endpoint, AzureKeyCredential(key))
 
 
-# Define a function to extract text from a file
+class PartialText(str):
+    """
+    Text extracted with some pages missing, e.g. because Form Recognizer failed. It is
+    returned to the caller but never cached, so that the next upload retries the missing pages.
+    """
+
+
+# Extracted text is cached by the SHA-256 of the file, in memory (bounded by characters) and on disk.
+# Bump the version whenever extraction output changes, so that stale entries are not served.
+EXTRACTION_CACHE_VERSION = 4
+_extraction_memory_cache = LRUCache(maxsize=EXTRACTION_CACHE_MEMORY_CHARS, getsizeof=lambda text: max(len(text), 1))
+_extraction_disk_cache = DiskCache("document_extractions", default_ttl=EXTRACTION_CACHE_TTL_SECONDS, max_bytes=EXTRACTION_CACHE_DISK_MAX_BYTES)
+_extraction_cache_lock = threading.Lock()
+_extraction_cache_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+
+def get_document_id(file_content) -> str:
+    return hashlib.sha256(file_content).hexdigest()
+
+
+def _get_extraction_cache_key(file_content, file_mime_type) -> str:
+    return f"v{EXTRACTION_CACHE_VERSION}:{file_mime_type}:{get_document_id(file_content)}"
+
+
+def get_cached_extraction(file_content, file_mime_type):
+    """
+    Returns the cached text of a file, or None if it has not been extracted before.
+    """
+    key = _get_extraction_cache_key(file_content, file_mime_type)
+
+    with _extraction_cache_lock:
+        text = _extraction_memory_cache.get(key)
+        if text is not None:
+            _extraction_cache_stats["memory_hits"] += 1
+            return text
+
+    text = _extraction_disk_cache.get(key)
+    with _extraction_cache_lock:
+        if text is None:
+            _extraction_cache_stats["misses"] += 1
+            return None
+        _extraction_cache_stats["disk_hits"] += 1
+        if len(text) <= EXTRACTION_CACHE_MEMORY_CHARS:
+            _extraction_memory_cache[key] = text
+    return text
+
+
+def cache_extraction(file_content, file_mime_type, text):
+    key = _get_extraction_cache_key(file_content, file_mime_type)
+    with _extraction_cache_lock:
+        if len(text) <= EXTRACTION_CACHE_MEMORY_CHARS:
+            _extraction_memory_cache[key] = text
+    _extraction_disk_cache.set(key, text)
+
+
+def get_extraction_cache_stats() -> dict:
+    with _extraction_cache_lock:
+        return {**_extraction_cache_stats, "memory_chars": _extraction_memory_cache.currsize}
+
+
+register_metrics_source("extraction_cache", get_extraction_cache_stats)
+
+
+# Define a function to extract text from a file, reusing the text of files extracted before
 def extract_text_from_file(file_content, file_mime_type):
-    try:
-        # Handle .docx files
-        if file_mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
-            logging.info("Processing a .docx file")
-            return extract_text_from_docx(file_content)
-        
-        # Handle .xlsx files
-        elif file_mime_type == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet':
-            logging.info("Processing an .xlsx file")
-            return extract_text_from_xlsx(file_content)
-        
-        # Handle .pptx files
-        elif file_mime_type == 'application/vnd.openxmlformats-officedocument.presentationml.presentation':
-            logging.info("Processing a .pptx file")
-            return extract_text_from_pptx(file_content)
-        
-        # Handle PDFs and images with Azure Form Recognizer
-        else:
-            client = get_form_recognizer_client()
-            poller = client.begin_analyze_document(
-                "prebuilt-read", document=file_content
-            )
-            result = poller.result()
-            extracted_text = ""
-            for page in result.pages:
-                for line in page.lines:
-                    extracted_text += line.content + "\n"
-            return extracted_text
+    extracted_text = get_cached_extraction(file_content, file_mime_type)
+    if extracted_text is not None:
+        logging.info("Reusing the cached text of an uploaded file")
+        return extracted_text
 
+    try:
+        extracted_text = extract_text(file_content, file_mime_type)
     except Exception as e:
+        # Failures are not cached, so that transient errors are retried on the next upload
         logging.error(f"Error extracting text from file: {e}")
         return ""
 
+    # Partial text is used for this upload only, so that the missing pages are retried next time
+    if not isinstance(extracted_text, PartialText):
+        cache_extraction(file_content, file_mime_type, extracted_text)
+    return extracted_text
 
-# Define a function to extract text from a .docx file
-def extract_text_from_docx(file_content):
-    extracted_text = ""
+
+# Define a function to extract text from a file with the extractor for its type
+def extract_text(file_content, file_mime_type):
+    # Handle .docx files
+    if file_mime_type == 'application/vnd.openxmlformats-officedocument.wordprocessingml.document':
+        logging.info("Processing a .docx file")
+        return extract_text_from_docx(file_content)
+    
+    # Handle .xlsx files
+    elif file_mime_type == 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet':
+        logging.info("Processing an .xlsx file")
+        return extract_text_from_xlsx(file_content)
+    
+    # Handle .pptx files
+    elif file_mime_type == 'application/vnd.openxmlformats-officedocument.presentationml.presentation':
+        logging.info("Processing a .pptx file")
+        return extract_text_from_pptx(file_content)
+    
+    # Handle PDFs locally where they have a text layer, and the remaining pages with Azure Form Recognizer
+    elif file_mime_type == 'application/pdf':
+        logging.info("Processing a .pdf file")
+        return extract_text_from_pdf(file_content)
+
+    # Handle images with Azure Form Recognizer
+    else:
+        page_texts = analyze_with_form_recognizer(file_content)
+        return "".join(page_texts[page_number] for page_number in sorted(page_texts))
+
+
+# Define a function to read a document with the Form Recognizer `prebuilt-read` model
+def analyze_with_form_recognizer(file_content, pages=None):
+    """
+    Returns the text of each analyzed page, keyed by 1-based page number.
+
+    Args:
+        file_content (bytes): The document.
+        pages (list[int]): The page numbers to analyze. Defaults to all pages.
+    """
+    client = get_form_recognizer_client()
+    options = {"pages": format_page_ranges(pages)} if pages else {}
+    poller = client.begin_analyze_document(
+        "prebuilt-read", document=file_content, **options
+    )
+    result = poller.result()
+
+    page_texts = {}
+    for page in result.pages:
+        page_texts[page.page_number] = "".join(line.content + "\n" for line in page.lines)
+    return page_texts
+
+
+def format_page_ranges(page_numbers):
+    """
+    Formats page numbers as the ranges accepted by Form Recognizer, e.g. [1, 2, 3, 7] as "1-3,7".
+    """
+    ranges = []
+    for page_number in sorted(page_numbers):
+        if ranges and page_number == ranges[-1][1] + 1:
+            ranges[-1][1] = page_number
+        else:
+            ranges.append([page_number, page_number])
+    return ",".join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+_pdf_extraction_stats = {"documents": 0, "local_pages": 0, "remote_pages": 0, "remote_documents": 0, "remote_failures": 0}
+_pdf_extraction_lock = threading.Lock()
+
+
+def get_pdf_extraction_stats() -> dict:
+    with _pdf_extraction_lock:
+        return dict(_pdf_extraction_stats)
+
+
+register_metrics_source("pdf_extraction", get_pdf_extraction_stats)
+
+
+# Define a function to read the text layer of each page of a PDF
+def extract_pdf_text_layer(file_content):
+    """
+    Returns the text layer of each page, or None if the PDF cannot be read locally.
+    """
+    if PdfReader is None:
+        return None
     try:
-        document = DocxDocument(BytesIO(file_content))
-        for para in document.paragraphs:
-            extracted_text += para.text + "\n"
+        reader = PdfReader(BytesIO(file_content))
+        return [page.extract_text() or "" for page in reader.pages]
     except Exception as e:
-        logging.error(f"Error extracting text from .docx file: {e}")
-    return extracted_text
+        logging.warning(f"Reading the PDF text layer failed, using Form Recognizer: {e}")
+        return None
+
+
+# Define a function to extract text from a PDF, sending only pages without a text layer to Form Recognizer
+def extract_text_from_pdf(file_content):
+    page_texts = extract_pdf_text_layer(file_content)
+    remote_failed = False
+
+    if page_texts is None:
+        remote_texts = analyze_with_form_recognizer(file_content)
+        page_texts = [remote_texts[page_number] for page_number in sorted(remote_texts)]
+        local_pages, remote_pages = 0, len(page_texts)
+    else:
+        # Scanned pages and images have no (or almost no) text layer
+        missing_pages = [
+            index + 1 for index, text in enumerate(page_texts)
+            if len(text.strip()) < PDF_MIN_TEXT_CHARS_PER_PAGE
+        ]
+        if missing_pages:
+            try:
+                remote_texts = analyze_with_form_recognizer(file_content, pages=missing_pages)
+            except Exception as e:
+                # Keep the pages read locally; only the pages sent to Form Recognizer are missing
+                logging.error(f"Form Recognizer failed for PDF pages {format_page_ranges(missing_pages)}: {e}")
+                remote_texts = {}
+                remote_failed = True
+                with _pdf_extraction_lock:
+                    _pdf_extraction_stats["remote_failures"] += 1
+            for page_number in missing_pages:
+                page_texts[page_number - 1] = remote_texts.get(page_number, page_texts[page_number - 1])
+        local_pages, remote_pages = len(page_texts) - len(missing_pages), len(missing_pages)
+
+    with _pdf_extraction_lock:
+        _pdf_extraction_stats["documents"] += 1
+        _pdf_extraction_stats["local_pages"] += local_pages
+        _pdf_extraction_stats["remote_pages"] += remote_pages
+        _pdf_extraction_stats["remote_documents"] += int(remote_pages > 0)
+    logging.info(f"Extracted {local_pages} PDF pages locally and {remote_pages} with Form Recognizer")
+
+    text = "".join(text if text.endswith("\n") else text + "\n" for text in page_texts)
+    return PartialText(text) if remote_failed else text
+
+
+# Define a function to join the text fragments yielded by an extractor in a single pass
+def join_text_fragments(fragments, file_type):
+    """
+    Joins text fragments once at the end instead of growing a string per fragment.
+    If the extractor fails part way, the text extracted so far is returned.
+    """
+    parts = []
+    try:
+        for fragment in fragments:
+            parts.append(fragment)
+    except Exception as e:
+        logging.error(f"Error extracting text from {file_type} file: {e}")
+    return "".join(parts)
+
+
+# Define a function to extract text from a .docx file
+def iter_docx_text(file_content):
+    document = DocxDocument(BytesIO(file_content))
+    for para in document.paragraphs:
+        yield para.text + "\n"
+
+
+def extract_text_from_docx(file_content):
+    return join_text_fragments(iter_docx_text(file_content), ".docx")
 
 
 # Define a function to extract text from a .xlsx file
-def extract_text_from_xlsx(file_content):
-    extracted_text = ""
+def iter_xlsx_text(file_content, max_rows_per_sheet=XLSX_MAX_ROWS_PER_SHEET, max_columns=XLSX_MAX_COLUMNS, max_chars=EXTRACTION_MAX_CHARS):
+    """
+    Streams the rows of a workbook as tab-separated lines without loading every cell in memory.
+
+    Args:
+        file_content (bytes): The content of the .xlsx file.
+        max_rows_per_sheet (int): The number of rows read from each sheet, or None for all rows.
+        max_columns (int): The number of leading columns read from each row, or None for all columns.
+        max_chars (int): The number of characters after which extraction stops, or None for no limit.
+    """
+    # Read-only mode parses rows lazily instead of building a cell object per cell up front
+    workbook = openpyxl.load_workbook(BytesIO(file_content), read_only=True, data_only=True)
     try:
-        workbook = openpyxl.load_workbook(BytesIO(file_content), data_only=True)
+        extracted_chars = 0
         for sheet in workbook.worksheets:
-            for row in sheet.iter_rows(values_only=True):
-                row_text = [str(cell) if cell is not None else "" for cell in row]
-                extracted_text += "\t".join(row_text) + "\n"
-    except Exception as e:
-        logging.error(f"Error extracting text from .xlsx file: {e}")
-    return extracted_text
+            # Many writers store a wrong <dimension> tag (often "A1"), which read-only mode trusts
+            sheet.reset_dimensions()
+            for row_number, row in enumerate(sheet.iter_rows(max_col=max_columns, values_only=True)):
+                if max_rows_per_sheet is not None and row_number >= max_rows_per_sheet:
+                    yield f"[Rows after row {max_rows_per_sheet} of sheet {sheet.title} omitted]\n"
+                    break
+
+                # Rows are padded to `max_columns` with empty cells, which carry no text
+                cells = list(row)
+                while cells and cells[-1] is None:
+                    cells.pop()
+
+                line = "\t".join(str(cell) if cell is not None else "" for cell in cells) + "\n"
+                extracted_chars += len(line)
+                if max_chars is not None and extracted_chars > max_chars:
+                    yield f"[Spreadsheet truncated after {max_chars} characters]\n"
+                    return
+                yield line
+    finally:
+        workbook.close()
+
+
+def extract_text_from_xlsx(file_content, **limits):
+    return join_text_fragments(iter_xlsx_text(file_content, **limits), ".xlsx")
 
 
 # Define a function to extract text from a .pptx file
+def iter_pptx_text(file_content):
+    presentation = Presentation(BytesIO(file_content))
+    for slide in presentation.slides:
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                yield shape.text + "\n"
+
+
 def extract_text_from_pptx(file_content):
-    extracted_text = ""
-    try:
-        presentation = Presentation(BytesIO(file_content))
-        for slide in presentation.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    extracted_text += shape.text + "\n"
-    except Exception as e:
-        logging.error(f"Error extracting text from .pptx file: {e}")
-    return extracted_text
+    return join_text_fragments(iter_pptx_text(file_content), ".pptx")
 
 def extract_text_from_txt(file_content):
     return file_content.decode('utf-8', errors='ignore')
@@ -4,25 +4,58 @@ Classes:
     MongoDBClient: A client class for interacting with MongoDB, supporting operations such as connecting to the database, loading data, and clearing collections.
 Methods:
     get_mongodb_variables(): Retrieves MongoDB connection string from environment variables.
-    get_client(): Returns a MongoDB client instance, using a mock client if in a test environment.
+    get_client(): Returns the shared, pool-configured MongoDB client instance, using a mock client if in a test environment.
     get_mongodb_loader(collection_name, db_filter): Returns a MongodbLoader instance for loading documents from a specified collection with given filter criteria.
     get_db_name(): Returns the database name based on the current environment.
     clear_collections(db, collection_names): Clears the specified collections in the given database.
-    load_products(db, dataset, Model, coll_name): Loads products into the specified collection from a dataset URL, using the provided model for validation.
-    execute_with_retries(operation, max_retries=5): Executes a given operation with retries, handling specific MongoDB write errors and retrying with exponential backoff.
+    load_products(db, dataset, Model, coll_name): Streams products from a dataset URL into the specified collection, validating them with the provided model and writing concurrent unordered batches.
+    execute_with_retries(operation, max_retries=5): Executes a given operation under the shared RetryPolicy, which honors RetryAfterMs hints and otherwise backs off exponentially.
+    aexecute_with_retries(operation, max_retries=5): The async variant of execute_with_retries.
+    ensure_indexes(db): Creates the indexes required by the hot query paths.
+    check_indexes(db): Explains the hot queries and returns those answered with a collection scan or with an unreadable plan.
+
+Usage:
+    python -m services.azure_mongodb check-indexes
 """
 
 """ Step 1: Import required libraries """
 import os
+import sys
+import asyncio
+import inspect
 import time
+import argparse
 import random
 import logging
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import parse_qs, urlsplit
 import requests
 import pymongo
-from pymongo import UpdateOne
+from pymongo import ASCENDING, DESCENDING, UpdateOne, monitoring
+from bson import ObjectId
+from pydantic import ValidationError
 import mongomock
 from langchain_community.document_loaders.mongodb import MongodbLoader
-from utils.consts import APP_NAME
+from utils.consts import (
+    APP_NAME,
+    EXTRACTION_CACHE_TTL_SECONDS,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_MIN_POOL_SIZE,
+    MONGO_MAX_IDLE_TIME_MS,
+    MONGO_COMPRESSORS,
+    MONGO_SERVER_SELECTION_TIMEOUT_MS,
+    MONGO_CONNECT_TIMEOUT_MS,
+    MONGO_MAX_RETRIES,
+    MONGO_RETRY_BASE_DELAY_SECONDS,
+    MONGO_RETRY_MAX_DELAY_SECONDS,
+    MONGO_RETRY_BUDGET,
+    MONGO_RETRY_BUDGET_REFILL,
+    MONGO_LOAD_BATCH_SIZE,
+    MONGO_LOAD_CONCURRENCY,
+)
+from utils.streaming import iter_batches, iter_json_array
+from utils.metrics import register_metrics_source
 from dotenv import load_dotenv
 
 """ Step 2: Configure logging and load environment variables """
@@ -30,10 +63,286 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 load_dotenv()
 
-""" Step 3: Define the MongoDBClient class and its methods """
+# Indexes required by the hot query paths, per collection
+REQUIRED_INDEXES = {
+    "chat_summaries": [
+        {"keys": [("user_id", ASCENDING), ("chat_id", DESCENDING)]},
+    ],
+    "user_journeys": [
+        {"keys": [("user_id", ASCENDING)]},
+    ],
+    "users": [
+        {"keys": [("email", ASCENDING)]},
+        {"keys": [("username", ASCENDING)]},
+    ],
+    "chat_turns": [
+        {"keys": [("SessionId", ASCENDING), ("_id", ASCENDING)]},
+    ],
+    "tool_result_cache": [
+        {"keys": [("expires_at", ASCENDING)], "expireAfterSeconds": 0},
+    ],
+    "document_extractions": [
+        {"keys": [("updated_at", ASCENDING)], "expireAfterSeconds": EXTRACTION_CACHE_TTL_SECONDS},
+    ],
+}
+
+# Representative hot queries as (collection, filter, sort) that must not scan their collection
+HOT_QUERIES = [
+    ("chat_summaries", {"user_id": "index-check"}, [("chat_id", DESCENDING)]),
+    ("user_journeys", {"user_id": "index-check"}, None),
+    ("users", {"email": "index-check"}, None),
+    ("users", {"username": "index-check"}, None),
+    ("chat_turns", {"SessionId": "index-check-0"}, [("_id", DESCENDING)]),
+    ("chat_turns", {"SessionId": "index-check-0", "_id": {"$gt": ObjectId("000000000000000000000000")}}, [("_id", ASCENDING)]),
+]
+
+""" Step 3: Define the connection pool listener """
+class ConnectionPoolMetrics(monitoring.ConnectionPoolListener):
+    """
+    Counts CMAP connection pool events of the shared client, so that pool sizing can be tuned from /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checked_out": 0,
+            "checkout_failures": 0,
+            "pools_cleared": 0,
+            "in_use": 0,
+            "max_in_use": 0,
+            "checkout_seconds": 0.0,
+            "max_checkout_seconds": 0.0,
+        }
+
+    def _increment(self, counter: str, amount=1):
+        with self._lock:
+            self._stats[counter] += amount
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._increment("pools_cleared")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._increment("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._increment("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._increment("checkout_failures")
+
+    def connection_checked_out(self, event):
+        # The time spent waiting for a connection is reported by pymongo 4.7+
+        duration = getattr(event, "duration", 0.0) or 0.0
+        with self._lock:
+            self._stats["checked_out"] += 1
+            self._stats["in_use"] += 1
+            self._stats["max_in_use"] = max(self._stats["max_in_use"], self._stats["in_use"])
+            self._stats["checkout_seconds"] += duration
+            self._stats["max_checkout_seconds"] = max(self._stats["max_checkout_seconds"], duration)
+
+    def connection_checked_in(self, event):
+        self._increment("in_use", -1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["avg_checkout_seconds"] = (stats["checkout_seconds"] / stats["checked_out"]) if stats["checked_out"] else 0.0
+        return stats
+
+
+connection_pool_metrics = ConnectionPoolMetrics()
+register_metrics_source("mongo_connection_pool", connection_pool_metrics.stats)
+
+
+""" Step 4: Define the retry policy """
+# Cosmos DB reports throttling with this error code and a RetryAfterMs hint in the message
+TOO_MANY_REQUESTS_CODE = 16500
+
+
+def get_retry_after_ms(error):
+    """
+    Returns the largest RetryAfterMs hint in a MongoDB error, or None if the server gave none.
+    """
+    messages = [str(error)]
+    details = getattr(error, "details", None) or {}
+    messages.append(str(details.get("errmsg", "")))
+    messages.extend(str(err.get("errmsg", "")) for err in details.get("writeErrors", []))
+
+    hints = []
+    for message in messages:
+        if "RetryAfterMs=" in message:
+            try:
+                hints.append(int(message.split("RetryAfterMs=")[1].split(",")[0].strip()))
+            except ValueError:
+                continue
+    return max(hints, default=None)
+
+
+class RetryPolicy:
+    """
+    Retries throttled and transient MongoDB operations.
+
+    The delay honors the server's RetryAfterMs hint when there is one, and otherwise uses
+    capped exponential backoff with full jitter. Retries draw from a shared budget that
+    successful operations refill, so a throttled database does not receive a retry storm.
+    """
+
+    def __init__(self, max_retries: int = MONGO_MAX_RETRIES, base_delay: float = MONGO_RETRY_BASE_DELAY_SECONDS, max_delay: float = MONGO_RETRY_MAX_DELAY_SECONDS, budget: float = MONGO_RETRY_BUDGET, budget_refill: float = MONGO_RETRY_BUDGET_REFILL):
+        """
+        Initializes a RetryPolicy object.
+
+        Args:
+            max_retries (int): The default number of retries per operation.
+            base_delay (float): The backoff of the first retry without a server hint, in seconds.
+            max_delay (float): The maximum delay between two attempts, in seconds.
+            budget (float): The maximum number of retry tokens. Each retry spends one.
+            budget_refill (float): The tokens returned to the budget by each successful operation.
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_budget = budget
+        self.budget_refill = budget_refill
+        self._budget = float(budget)
+        self._lock = threading.Lock()
+        self._stats = {
+            "operations": 0,
+            "retries": 0,
+            "throttled": 0,
+            "failures": 0,
+            "budget_exhausted": 0,
+            "backoff_seconds": 0.0,
+        }
+
+    @staticmethod
+    def is_retryable(error) -> bool:
+        if isinstance(error, (pymongo.errors.AutoReconnect, pymongo.errors.NetworkTimeout)):
+            return True
+        if isinstance(error, pymongo.errors.OperationFailure):
+            return error.code == TOO_MANY_REQUESTS_CODE or get_retry_after_ms(error) is not None
+        return False
+
+    def get_delay(self, error, attempt: int) -> float:
+        """
+        Returns the number of seconds to wait before retrying after the given failed attempt.
+        """
+        retry_after_ms = get_retry_after_ms(error)
+        if retry_after_ms is not None:
+            # A little jitter keeps throttled workers from retrying in lockstep
+            delay = retry_after_ms / 1000.0
+            return min(self.max_delay, delay + random.uniform(0, max(delay * 0.1, 0.005)))
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def _record_success(self):
+        with self._lock:
+            self._stats["operations"] += 1
+            self._budget = min(self.max_budget, self._budget + self.budget_refill)
+
+    def _before_retry(self, error, attempt: int, max_retries: int) -> float:
+        """
+        Returns the delay before the next attempt, or raises if the operation must not be retried.
+        """
+        with self._lock:
+            if not self.is_retryable(error):
+                self._stats["operations"] += 1
+                self._stats["failures"] += 1
+                raise error
+
+            if attempt >= max_retries:
+                self._stats["operations"] += 1
+                self._stats["failures"] += 1
+                raise Exception("Maximum retries exceeded") from error
+
+            if self._budget < 1:
+                self._stats["operations"] += 1
+                self._stats["failures"] += 1
+                self._stats["budget_exhausted"] += 1
+                raise Exception("Retry budget exhausted") from error
+
+            self._budget -= 1
+            delay = self.get_delay(error, attempt)
+            self._stats["retries"] += 1
+            self._stats["throttled"] += int(get_retry_after_ms(error) is not None)
+            self._stats["backoff_seconds"] += delay
+
+        logger.info(f"Retrying MongoDB operation after {delay:.3f} seconds ({type(error).__name__}).")
+        return delay
+
+    def run(self, operation, max_retries: int = None):
+        """
+        Runs a blocking operation, retrying it while it fails with a retryable error.
+
+        Args:
+            operation (callable): The operation to run, without arguments.
+            max_retries (int): The number of retries. Defaults to the policy's setting.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            try:
+                result = operation()
+            except Exception as e:
+                time.sleep(self._before_retry(e, attempt, max_retries))
+                attempt += 1
+                continue
+            self._record_success()
+            return result
+
+    async def arun(self, operation, max_retries: int = None):
+        """
+        Runs an operation from async code, retrying it while it fails with a retryable error.
+        Coroutine functions are awaited; blocking callables run in a worker thread.
+
+        Args:
+            operation (callable): The operation to run, without arguments.
+            max_retries (int): The number of retries. Defaults to the policy's setting.
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        attempt = 0
+        while True:
+            try:
+                if inspect.iscoroutinefunction(operation):
+                    result = await operation()
+                else:
+                    result = await asyncio.to_thread(operation)
+            except Exception as e:
+                await asyncio.sleep(self._before_retry(e, attempt, max_retries))
+                attempt += 1
+                continue
+            self._record_success()
+            return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "budget": self._budget}
+
+
+mongo_retry_policy = RetryPolicy()
+register_metrics_source("mongo_retries", mongo_retry_policy.stats)
+
+
+""" Step 5: Define the MongoDBClient class and its methods """
 class MongoDBClient:
     _client = None
     _db_name = None
+    _client_lock = threading.Lock()
 
     @staticmethod
     def get_mongodb_variables():
@@ -48,13 +357,35 @@ class MongoDBClient:
         logging.info(f"Env:{ENV}")
 
         if cls._client is None:
-            if ENV == "test":
-                cls._client = mongomock.MongoClient()
-            else:
-                cls._client = pymongo.MongoClient(CONNECTION_STRING)
+            with cls._client_lock:
+                if cls._client is None:
+                    if ENV == "test":
+                        cls._client = mongomock.MongoClient()
+                    else:
+                        cls._client = MongoDBClient.create_client(CONNECTION_STRING)
 
         return cls._client
 
+    @staticmethod
+    def create_client(connection_string):
+        """
+        Creates a MongoDB client with the app's pool, compression and timeout settings.
+        Options set in the connection string take precedence.
+        """
+        options = {
+            "appname": APP_NAME,
+            "maxPoolSize": MONGO_MAX_POOL_SIZE,
+            "minPoolSize": MONGO_MIN_POOL_SIZE,
+            "maxIdleTimeMS": MONGO_MAX_IDLE_TIME_MS,
+            "compressors": MONGO_COMPRESSORS,
+            "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        }
+        uri_options = {name.lower() for name in parse_qs(urlsplit(connection_string or "").query)}
+        options = {key: value for key, value in options.items() if key.lower() not in uri_options}
+
+        return pymongo.MongoClient(connection_string, event_listeners=[connection_pool_metrics], **options)
+
     @staticmethod
     def get_mongodb_loader(collection_name, db_filter):
         CONNECTION_STRING = MongoDBClient.get_mongodb_variables()
@@ -92,55 +423,177 @@ class MongoDBClient:
             raise
 
     @staticmethod
-    def load_products(db, dataset, Model, coll_name):
+    def load_products(db, dataset, Model, coll_name, batch_size=MONGO_LOAD_BATCH_SIZE, max_concurrency=MONGO_LOAD_CONCURRENCY, progress_callback=None):
+        """
+        Streams a JSON array from a dataset URL into a collection.
+
+        Items are parsed as the response arrives, validated in batches, and upserted with
+        unordered bulk writes, several batches at a time. Invalid items are skipped and counted.
+
+        Args:
+            db: The database to load into.
+            dataset (str): The URL of a JSON document whose top level is an array.
+            Model: The Pydantic model used to validate each item.
+            coll_name (str): The name of the collection.
+            batch_size (int): The number of items per bulk write.
+            max_concurrency (int): The number of bulk writes in flight.
+            progress_callback (callable): Called with the progress report after each batch.
+
+        Returns:
+            dict: The number of loaded and invalid items, the elapsed time and the load rate.
+        """
+        report = {"collection": coll_name, "loaded": 0, "invalid": 0, "bytes": 0, "total_bytes": None, "seconds": 0.0, "rows_per_second": 0.0}
+        started = time.perf_counter()
+        last_logged = started
+
+        def write_batch(objs):
+            operations = [UpdateOne({"_id": obj.id}, {"$set": obj.dict(by_alias=True)}, upsert=True) for obj in objs]
+            MongoDBClient.execute_with_retries(lambda: db[coll_name].bulk_write(operations, ordered=False))
+            return len(objs)
+
+        def read_chunks(response):
+            for chunk in response.iter_content(chunk_size=1024 * 1024):
+                report["bytes"] += len(chunk)
+                yield chunk
+
+        def validate(items):
+            valid_objs = []
+            for data in items:
+                try:
+                    valid_objs.append(Model(**data))
+                except (ValidationError, TypeError) as e:
+                    report["invalid"] += 1
+                    if report["invalid"] <= 10:
+                        logger.warning(f"Skipping invalid {coll_name} item: {str(e)}")
+            return valid_objs
+
+        def collect(done):
+            nonlocal last_logged
+            for future in done:
+                report["loaded"] += future.result()
+
+            now = time.perf_counter()
+            report["seconds"] = now - started
+            report["rows_per_second"] = report["loaded"] / report["seconds"] if report["seconds"] else 0.0
+            if progress_callback:
+                progress_callback(dict(report))
+            if now - last_logged >= 5:
+                last_logged = now
+                percent = f" ({report['bytes'] / report['total_bytes']:.0%} of the download)" if report["total_bytes"] else ""
+                logger.info(f"Loaded {report['loaded']} {coll_name} at {report['rows_per_second']:.0f} rows/s{percent}.")
+
         try:
-            raw_data = dataset
-            response = requests.get(raw_data)
-            response_as_json = response.json()
-            valid_objs = [Model(**data) for data in response_as_json]
-
-            def bulk_write_operation():
-                db[coll_name].bulk_write([UpdateOne({"_id": obj.id}, {"$set": obj.dict(
-                    by_alias=True)}, upsert=True) for obj in valid_objs])
-
-            if valid_objs:
-                MongoDBClient.execute_with_retries(bulk_write_operation)
-                logger.info(f"Loaded {len(valid_objs)} {coll_name}.")
-                return valid_objs  # Ensure objects are returned
+            with requests.get(dataset, stream=True, timeout=(10, 60)) as response, ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+                response.raise_for_status()
+                content_length = response.headers.get("Content-Length")
+                report["total_bytes"] = int(content_length) if content_length and content_length.isdigit() else None
+
+                in_flight = set()
+                for items in iter_batches(iter_json_array(read_chunks(response)), batch_size):
+                    valid_objs = validate(items)
+                    if not valid_objs:
+                        continue
+
+                    # Bound the number of pending batches so memory stays flat
+                    if len(in_flight) >= max_concurrency:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    in_flight.add(executor.submit(write_batch, valid_objs))
+
+                collect(in_flight)
+
+            if report["loaded"]:
+                logger.info(f"Loaded {report['loaded']} {coll_name} in {report['seconds']:.1f}s ({report['rows_per_second']:.0f} rows/s, {report['invalid']} invalid).")
             else:
                 logger.warning(f"No valid {coll_name} to load.")
-                return []
+            return report
         except Exception as e:
             logger.error(f"Error loading {coll_name}: {str(e)}")
             raise
 
     @staticmethod
     def execute_with_retries(operation, max_retries=5):
-        retries = 0
-        while retries < max_retries:
-            try:
-                return operation()
-            except (pymongo.errors.BulkWriteError, pymongo.errors.WriteError) as e:
-                retry_after_ms = 100  # Default retry interval
-                if hasattr(e, 'details'):
-                    # Extracting retry after ms from BulkWriteError
-                    retry_after_ms = max(
-                        (int(err.get('errmsg', '').split('RetryAfterMs=')[1].split(',')[0])
-                         for err in e.details.get('writeErrors', [])
-                         if 'RetryAfterMs=' in err.get('errmsg', '')),
-                        default=100
-                    )
-                elif 'RetryAfterMs' in str(e):
-                    # Extracting retry after ms from WriteError
-                    retry_after_msg = str(e).split("RetryAfterMs=")[1]
-                    retry_after_ms = int(retry_after_msg.split(',')[0])
-
-                sleep_time = max(retry_after_ms / 1000.0, 1.0) + \
-                    random.uniform(0.05, 0.1)
-                time.sleep(sleep_time)
-                retries += 1
-                print(f"Retrying after {sleep_time} seconds...")
-            except Exception as e:
-                print(f"Error during operation: {e}")
-                raise
-        raise Exception("Maximum retries exceeded")
\ No newline at end of file
+        """
+        Runs a blocking operation under the shared retry policy.
+        """
+        return mongo_retry_policy.run(operation, max_retries=max_retries)
+
+    @staticmethod
+    async def aexecute_with_retries(operation, max_retries=5):
+        """
+        Runs an operation under the shared retry policy without blocking the event loop while backing off.
+        """
+        return await mongo_retry_policy.arun(operation, max_retries=max_retries)
+
+    @staticmethod
+    def ensure_indexes(db):
+        """
+        Creates the indexes in REQUIRED_INDEXES that do not exist yet. Creating an existing index is a no-op.
+        """
+        for coll_name, indexes in REQUIRED_INDEXES.items():
+            for index in indexes:
+                options = {key: value for key, value in index.items() if key != "keys"}
+                try:
+                    db[coll_name].create_index(index["keys"], **options)
+                except pymongo.errors.PyMongoError as e:
+                    logger.error(f"Failed to create index {index['keys']} on {coll_name}: {str(e)}")
+        logger.info("Ensured indexes for the hot query paths.")
+
+    @staticmethod
+    def check_indexes(db):
+        """
+        Explains each query in HOT_QUERIES and returns the ones that scan their collection, or
+        whose plan could not be read. Plans without any stage are treated as failures, so that
+        unfamiliar explain output (e.g. from the Cosmos DB Mongo API) does not pass unchecked.
+
+        Returns:
+            list: (collection name, filter, problem) tuples, where problem is "COLLSCAN" or "unknown plan".
+        """
+        def find_stages(plan):
+            if isinstance(plan, dict):
+                if isinstance(plan.get("stage"), str):
+                    yield plan["stage"]
+                for value in plan.values():
+                    yield from find_stages(value)
+            elif isinstance(plan, list):
+                for value in plan:
+                    yield from find_stages(value)
+
+        failures = []
+        for coll_name, db_filter, sort in HOT_QUERIES:
+            cursor = db[coll_name].find(db_filter)
+            if sort:
+                cursor = cursor.sort(sort)
+            explain = cursor.explain()
+
+            # Fall back to the whole output when the plan is not under queryPlanner.winningPlan
+            plan = explain.get("queryPlanner", {}).get("winningPlan") or explain
+            stages = set(find_stages(plan))
+            if "COLLSCAN" in stages:
+                failures.append((coll_name, db_filter, "COLLSCAN"))
+            elif not stages:
+                logger.warning(f"Unrecognized explain output for {coll_name} {db_filter}: {explain}")
+                failures.append((coll_name, db_filter, "unknown plan"))
+        return failures
+
+
+""" Step 6: Define the command line entry point """
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the indexes of the hot query paths.")
+    parser.add_argument("command", choices=["ensure-indexes", "check-indexes"])
+    args = parser.parse_args(argv)
+
+    db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
+    MongoDBClient.ensure_indexes(db)
+
+    if args.command == "check-indexes":
+        failures = MongoDBClient.check_indexes(db)
+        for coll_name, db_filter, problem in failures:
+            print(f"{problem}: {coll_name} {db_filter}")
+        if failures:
+            sys.exit(f"{len(failures)} hot queries scan their collection or have a plan that could not be checked.")
+        print(f"All {len(HOT_QUERIES)} hot queries use an index.")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,26 @@
 
 """Step 1: Import necessary modules"""
 import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import openai
+import tiktoken
+from cachetools import LRUCache
 from dotenv import load_dotenv
 from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
-from utils.consts import CONTEXT_LENGTH_LIMIT
+from utils.consts import (
+    CONTEXT_LENGTH_LIMIT,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_MAX_BATCH_TOKENS,
+    EMBEDDING_MAX_CONCURRENCY,
+    EMBEDDING_TOKENS_PER_MINUTE,
+    EMBEDDING_MAX_RETRIES,
+)
+from utils.metrics import register_metrics_source
 
 """Step 2: Define the Azure OpenAI services"""
 # Define the function to get the Azure OpenAI variables
@@ -38,7 +55,7 @@ def get_azure_openai_llm():
 
 
 # Define the function to get the Azure OpenAI embeddings model
-def get_azure_openai_embeddings():
+def get_azure_openai_embeddings(chunk_size: int = EMBEDDING_BATCH_SIZE, max_retries: int = 2):
     AOAI_ENDPOINT, AOAI_KEY, AOAI_API_VERSION, AOAI_EMBEDDINGS, _ = get_azure_openai_variables()
 
     embedding_model = AzureOpenAIEmbeddings(
@@ -48,9 +65,239 @@ def get_azure_openai_embeddings():
         deployment=AOAI_EMBEDDINGS,
         model="text-embedding-3-small",  
         openai_api_type="azure",
-        chunk_size=10
+        chunk_size=chunk_size,
+        max_retries=max_retries
     )
 
     return embedding_model
 
 
+"""Step 3: Define the query embedding cache"""
+_query_embedding_cache = LRUCache(maxsize=QUERY_EMBEDDING_CACHE_SIZE)
+_query_embedding_lock = threading.Lock()
+_query_embedding_stats = {"hits": 0, "misses": 0}
+_query_embedding_model = None
+
+
+# Define the function to normalize a query before it is used as a cache key
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+# Define the function to embed a query, reusing embeddings of previously seen queries
+def get_query_embedding(query: str, embedding_model=None) -> list[float]:
+    """
+    Embeds a query with an in-process LRU cache in front of Azure OpenAI.
+
+    Args:
+        query (str): The query to embed.
+        embedding_model: The embeddings model to use on a cache miss.
+
+    Returns:
+        list[float]: The embedding of the normalized query.
+    """
+    global _query_embedding_model
+    key = normalize_query(query)
+
+    with _query_embedding_lock:
+        embedding = _query_embedding_cache.get(key)
+        if embedding is not None:
+            _query_embedding_stats["hits"] += 1
+            return embedding
+        _query_embedding_stats["misses"] += 1
+
+    if embedding_model is None:
+        if _query_embedding_model is None:
+            _query_embedding_model = get_azure_openai_embeddings()
+        embedding_model = _query_embedding_model
+
+    embedding = embedding_model.embed_query(key)
+
+    with _query_embedding_lock:
+        _query_embedding_cache[key] = embedding
+    return embedding
+
+
+def get_query_embedding_cache_stats() -> dict:
+    with _query_embedding_lock:
+        return {**_query_embedding_stats, "size": len(_query_embedding_cache)}
+
+
+register_metrics_source("query_embedding_cache", get_query_embedding_cache_stats)
+
+
+"""Step 4: Define the batched embedding pipeline"""
+_embedding_stats = {"batches": 0, "texts": 0, "tokens": 0, "rate_limited": 0, "backoff_seconds": 0.0}
+_embedding_stats_lock = threading.Lock()
+_token_encoding = None
+
+
+# Define the function to estimate the number of tokens in a text
+def estimate_tokens(text: str) -> int:
+    global _token_encoding
+    if _token_encoding is None:
+        try:
+            _token_encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logging.warning(f"Falling back to character-based token estimates: {e}")
+            _token_encoding = False
+    if _token_encoding:
+        return len(_token_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+class TokenBudget:
+    """
+    A thread-safe token bucket that limits embedding requests to a tokens-per-minute budget.
+    """
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.refill_per_second = tokens_per_minute / 60.0
+        self.available = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int):
+        """
+        Blocks until the budget can cover the given number of tokens.
+
+        Args:
+            tokens (int): The number of tokens the next request will use.
+        """
+        # A single batch larger than the whole budget waits for a full bucket
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.available = min(self.capacity, self.available + (now - self.updated) * self.refill_per_second)
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                wait_seconds = (tokens - self.available) / self.refill_per_second
+            time.sleep(wait_seconds)
+
+
+def _get_retry_after_seconds(error) -> float:
+    """
+    Reads the server-requested delay from the headers of a rate limit error, if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+def _embed_batch_with_backoff(embedding_model, texts: list[str], max_retries: int) -> list[list[float]]:
+    """
+    Embeds one batch, retrying on 429 responses after the delay requested by the server.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return embedding_model.embed_documents(texts)
+        except openai.RateLimitError as e:
+            if attempt == max_retries:
+                raise
+            retry_after = _get_retry_after_seconds(e)
+            if retry_after is None:
+                retry_after = min(2 ** attempt, 30)
+            sleep_time = retry_after + random.uniform(0, 0.25)
+            with _embedding_stats_lock:
+                _embedding_stats["rate_limited"] += 1
+                _embedding_stats["backoff_seconds"] += sleep_time
+            logging.warning(f"Embedding request throttled. Retrying after {sleep_time:.2f} seconds...")
+            time.sleep(sleep_time)
+
+
+# Define the function to pack texts into batches bounded by input count and tokens
+def pack_embedding_batches(texts: list[str], max_batch_size: int = EMBEDDING_BATCH_SIZE, max_batch_tokens: int = EMBEDDING_MAX_BATCH_TOKENS) -> list[tuple[list[int], int]]:
+    """
+    Packs texts into as few batches as the input and token limits allow.
+
+    Returns:
+        list: (indices into `texts`, estimated tokens) for each batch.
+    """
+    batches = []
+    indices, batch_tokens = [], 0
+    for index, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if indices and (len(indices) >= max_batch_size or batch_tokens + tokens > max_batch_tokens):
+            batches.append((indices, batch_tokens))
+            indices, batch_tokens = [], 0
+        indices.append(index)
+        batch_tokens += tokens
+    if indices:
+        batches.append((indices, batch_tokens))
+    return batches
+
+
+# Define the function to embed texts concurrently, yielding batches as they complete
+def stream_embeddings(texts: list[str], embedding_model=None, max_concurrency: int = EMBEDDING_MAX_CONCURRENCY, tokens_per_minute: int = EMBEDDING_TOKENS_PER_MINUTE, max_retries: int = EMBEDDING_MAX_RETRIES):
+    """
+    Embeds texts in max-size batches that run concurrently under a tokens-per-minute budget.
+
+    Batches are yielded in completion order, so callers can store results while
+    later batches are still being embedded.
+
+    Args:
+        texts (list[str]): The texts to embed.
+        embedding_model: The embeddings model to use. Defaults to a model that leaves retries to this pipeline.
+        max_concurrency (int): The maximum number of batches in flight.
+        tokens_per_minute (int): The token budget of the embeddings deployment.
+        max_retries (int): The number of retries on 429 responses per batch.
+
+    Yields:
+        tuple: (indices into `texts`, embeddings) for each completed batch.
+    """
+    if embedding_model is None:
+        embedding_model = get_azure_openai_embeddings(max_retries=0)
+
+    budget = TokenBudget(tokens_per_minute)
+
+    def embed_batch(indices, batch_tokens):
+        budget.acquire(batch_tokens)
+        embeddings = _embed_batch_with_backoff(embedding_model, [texts[i] for i in indices], max_retries)
+        with _embedding_stats_lock:
+            _embedding_stats["batches"] += 1
+            _embedding_stats["texts"] += len(indices)
+            _embedding_stats["tokens"] += batch_tokens
+        return indices, embeddings
+
+    pending_batches = iter(pack_embedding_batches(texts))
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embeddings") as executor:
+        # Keep a bounded number of batches in flight so results can be streamed out
+        in_flight = set()
+        for indices, batch_tokens in pending_batches:
+            in_flight.add(executor.submit(embed_batch, indices, batch_tokens))
+            if len(in_flight) >= max_concurrency:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+# Define the function to embed texts with the batched pipeline, preserving input order
+def embed_texts(texts: list[str], **kwargs) -> list[list[float]]:
+    embeddings = [None] * len(texts)
+    for indices, batch_embeddings in stream_embeddings(texts, **kwargs):
+        for index, embedding in zip(indices, batch_embeddings):
+            embeddings[index] = embedding
+    return embeddings
+
+
+def get_embedding_pipeline_stats() -> dict:
+    with _embedding_stats_lock:
+        return dict(_embedding_stats)
+
+
+register_metrics_source("embedding_pipeline", get_embedding_pipeline_stats)
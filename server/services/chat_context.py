@@ -0,0 +1,129 @@
+"""
+This module loads everything a chat turn reads from the database in one parallel batch,
+and keeps it available to the agent's tools for the rest of the request.
+"""
+
+"""Step 1: Import necessary modules"""
+# -- Standard libraries --
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# -- Custom modules --
+from services.azure_mongodb import MongoDBClient
+from services.db.user_repository import user_repository
+from services.past_summaries import SUMMARY_EMBEDDING_KEY
+from utils.consts import PAST_SUMMARIES_MAX_CANDIDATES
+
+
+"""Step 2: Define the ChatContext class"""
+class ChatContext:
+    """
+    The role, latest chat ID, recent chat summaries, user profile and user journey of a user,
+    as read at the start of a request.
+    """
+
+    def __init__(self, user_id: str, chat_id: int, desired_role: str, latest_chat_id: int, summaries: list[dict], user_profile: dict, user_journey: dict):
+        """
+        Initializes a ChatContext object.
+
+        Args:
+            user_id (str): The ID of the user.
+            chat_id (int): The ID of the requested chat, or None for the latest chat.
+            desired_role (str): The role chosen for the chat.
+            latest_chat_id (int): The ID of the user's most recent chat.
+            summaries (list[dict]): The user's most recent chat summaries, most recent first.
+            user_profile (dict): The user's profile without credentials, or None.
+            user_journey (dict): The user's journey document, or None.
+        """
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.desired_role = desired_role
+        self.latest_chat_id = latest_chat_id
+        self.summaries = summaries
+        self.user_profile = user_profile
+        self.user_journey = user_journey
+
+
+"""Step 3: Define the loader"""
+# The context queries are independent, so they run concurrently
+context_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="chat-context")
+
+
+def _find_summaries(db, user_id: str) -> list[dict]:
+    cursor = db["chat_summaries"].find(
+        {"user_id": user_id},
+        # Embeddings are only needed to rank by a query, and are read then by the selector
+        {"concerns_progress": 0, SUMMARY_EMBEDDING_KEY: 0},
+    ).sort("chat_id", -1).limit(PAST_SUMMARIES_MAX_CANDIDATES)
+    return list(cursor)
+
+
+def _find_user_journey(db, user_id: str) -> dict:
+    return db["user_journeys"].find_one({"user_id": user_id})
+
+
+def load_chat_context(user_id: str, chat_id: int = None) -> ChatContext:
+    """
+    Loads the context of a chat turn with one concurrent batch of queries.
+
+    Args:
+        user_id (str): The ID of the user.
+        chat_id (int): The ID of the chat whose role is needed. Defaults to the latest chat.
+    """
+    db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
+
+    summaries_future = context_executor.submit(_find_summaries, db, user_id)
+    profile_future = context_executor.submit(user_repository.get_profile, user_id)
+    journey_future = context_executor.submit(_find_user_journey, db, user_id)
+    summaries = summaries_future.result()
+
+    latest_chat_id = summaries[0].get("chat_id") if summaries else None
+    if chat_id is None:
+        chat_id = latest_chat_id
+
+    chat_summary = next((summary for summary in summaries if summary.get("chat_id") == chat_id), None)
+    if chat_summary is None and chat_id is not None:
+        # Only chats older than the loaded summaries need another query
+        chat_summary = db["chat_summaries"].find_one({"user_id": user_id, "chat_id": chat_id}, {"desired_role": 1})
+    desired_role = (chat_summary or {}).get("desired_role", "educational mentor")
+
+    return ChatContext(
+        user_id=user_id,
+        chat_id=chat_id,
+        desired_role=desired_role,
+        latest_chat_id=latest_chat_id,
+        summaries=summaries,
+        user_profile=profile_future.result(),
+        user_journey=journey_future.result(),
+    )
+
+
+"""Step 4: Track the contexts of the requests in flight"""
+_active_contexts = {}
+_active_contexts_lock = threading.Lock()
+
+
+def activate_chat_context(context: ChatContext):
+    """
+    Makes a context visible to the tools until `deactivate_chat_context` is called for it.
+    """
+    with _active_contexts_lock:
+        _active_contexts.setdefault(context.user_id, []).append(context)
+
+
+def deactivate_chat_context(context: ChatContext):
+    with _active_contexts_lock:
+        contexts = _active_contexts.get(context.user_id, [])
+        if context in contexts:
+            contexts.remove(context)
+        if not contexts:
+            _active_contexts.pop(context.user_id, None)
+
+
+def get_active_chat_context(user_id: str) -> ChatContext:
+    """
+    Returns the context of the user's most recent request in flight, or None.
+    """
+    with _active_contexts_lock:
+        contexts = _active_contexts.get(user_id)
+        return contexts[-1] if contexts else None
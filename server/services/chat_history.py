@@ -0,0 +1,235 @@
+"""
+This module keeps the chat history sent to the model bounded: the agent sees the most
+recent turns verbatim, preceded by a rolling summary of everything before them.
+"""
+
+"""Step 1: Import necessary modules"""
+# -- Standard libraries --
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+# -- 3rd Party libraries --
+from cachetools import LRUCache
+from langchain.memory.summary import ConversationSummaryMemory
+from langchain_core.messages import BaseMessage, SystemMessage, messages_from_dict
+from langchain_mongodb.chat_message_histories import (
+    DEFAULT_HISTORY_KEY,
+    DEFAULT_SESSION_ID_KEY,
+    MongoDBChatMessageHistory,
+)
+
+# -- Custom modules --
+from services.azure_mongodb import MongoDBClient
+from utils.consts import CHAT_HISTORY_WINDOW_TURNS, PROCESSING_STEP
+from utils.metrics import register_metrics_source
+
+
+"""Step 2: Define the chat history helpers"""
+def parse_session_id(session_id: str) -> tuple[str, int]:
+    """
+    Splits a `<user_id>-<chat_id>` session ID. User IDs may contain dashes, chat IDs do not.
+    """
+    user_id, _, chat_id = session_id.rpartition("-")
+    try:
+        return user_id, int(chat_id)
+    except ValueError:
+        return user_id, None
+
+
+"""Step 3: Define the ChatSummarizer class"""
+class ChatSummarizer:
+    """
+    Folds chat turns into a running summary stored on the chat's `chat_summaries` document.
+
+    The summary covers every message up to `last_summarized_id`, so each update only sends
+    the messages added since the previous update to the model.
+    """
+
+    def __init__(self, max_workers: int = 2):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chat-summary")
+        self._session_locks = LRUCache(maxsize=1024)
+        self._lock = threading.Lock()
+        self._stats = {"updates": 0, "summarized_messages": 0, "failures": 0}
+
+    @staticmethod
+    def _get_collection():
+        db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
+        return db["chat_summaries"]
+
+    def _get_session_lock(self, session_id: str) -> threading.Lock:
+        with self._lock:
+            lock = self._session_locks.get(session_id)
+            if lock is None:
+                lock = self._session_locks[session_id] = threading.Lock()
+            return lock
+
+    def get_state(self, user_id: str, chat_id: int) -> dict:
+        """
+        Returns the running summary of a chat and the ID of the last message it covers.
+        """
+        if chat_id is None:
+            return {}
+
+        state = self._get_collection().find_one(
+            {"user_id": user_id, "chat_id": chat_id},
+            {"rolling_summary": 1, "summarized_message_count": 1, "last_summarized_id": 1},
+        )
+        return state or {}
+
+    def update(self, history: "WindowedChatMessageHistory", llm, keep_recent_turns: int = CHAT_HISTORY_WINDOW_TURNS, min_new_turns: int = PROCESSING_STEP) -> str:
+        """
+        Folds the messages older than the last `keep_recent_turns` turns into the running summary
+        with a single model call.
+
+        Args:
+            history (WindowedChatMessageHistory): The history of the chat.
+            llm: The model used to write the summary.
+            keep_recent_turns (int): The number of most recent turns left out of the summary.
+            min_new_turns (int): The number of turns that must be waiting before the summary is updated.
+
+        Returns:
+            str: The running summary.
+        """
+        with self._get_session_lock(history.session_id):
+            state = self.get_state(history.user_id, history.chat_id)
+            summary = state.get("rolling_summary", "")
+
+            pending = history.get_messages_after(state.get("last_summarized_id"))
+            foldable = len(pending) - keep_recent_turns * 2
+            if foldable < max(min_new_turns * 2, 1):
+                return summary
+
+            folded = pending[:foldable]
+            summary = ConversationSummaryMemory(llm=llm).predict_new_summary(
+                [message for _, message in folded], summary
+            )
+
+            self._get_collection().update_one(
+                {"user_id": history.user_id, "chat_id": history.chat_id},
+                {
+                    "$set": {"rolling_summary": summary, "last_summarized_id": folded[-1][0]},
+                    "$inc": {"summarized_message_count": len(folded)},
+                },
+            )
+
+            with self._lock:
+                self._stats["updates"] += 1
+                self._stats["summarized_messages"] += len(folded)
+            return summary
+
+    def schedule_update(self, history: "WindowedChatMessageHistory", llm):
+        """
+        Updates the running summary in the background, off the request path.
+        """
+        def run_update():
+            try:
+                self.update(history, llm)
+            except Exception as e:
+                with self._lock:
+                    self._stats["failures"] += 1
+                logging.error(f"Failed to update the summary of session {history.session_id}: {e}", exc_info=True)
+
+        self._executor.submit(run_update)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats)
+
+
+"""Step 4: Define the WindowedChatMessageHistory class"""
+class WindowedChatMessageHistory(MongoDBChatMessageHistory):
+    """
+    A MongoDB chat history that only loads the turns not yet covered by the running summary,
+    capped at `window_turns` plus one summary step, and prepends the summary itself.
+
+    When an `llm` is given, adding messages schedules a summary update so that the
+    number of turns sent to the model stays flat as the chat grows.
+
+    Unlike its base class, it uses the app's shared MongoDB client instead of opening a
+    client per session, and relies on the indexes created at startup.
+    """
+
+    def __init__(self, session_id: str, collection_name: str = "chat_turns", window_turns: int = CHAT_HISTORY_WINDOW_TURNS, llm=None):
+        """
+        Initializes a WindowedChatMessageHistory object.
+
+        Args:
+            session_id (str): The `<user_id>-<chat_id>` session ID.
+            collection_name (str): The name of the collection storing the chat turns.
+            window_turns (int): The number of most recent turns kept verbatim.
+            llm: The model used to update the running summary, or None to never update it.
+        """
+        # The base initializer would open a new client and create an index on every call
+        self.connection_string = None
+        self.session_id = session_id
+        self.database_name = MongoDBClient.get_db_name()
+        self.collection_name = collection_name
+        self.session_id_key = DEFAULT_SESSION_ID_KEY
+        self.history_key = DEFAULT_HISTORY_KEY
+        self.history_size = None
+        self.client = MongoDBClient.get_client()
+        self.db = self.client[self.database_name]
+        self.collection = self.db[collection_name]
+
+        self.user_id, self.chat_id = parse_session_id(session_id)
+        self.window_turns = window_turns
+        self.llm = llm
+
+    def _load(self, query: dict, newest_first: bool = False, limit: int = 0) -> tuple[list, list[BaseMessage]]:
+        cursor = self.collection.find(query, {self.history_key: 1}).sort("_id", -1 if newest_first else 1)
+        if limit:
+            cursor = cursor.limit(limit)
+
+        docs = list(cursor)
+        if newest_first:
+            docs.reverse()
+
+        messages = messages_from_dict([json.loads(doc[self.history_key]) for doc in docs])
+        return [doc["_id"] for doc in docs], messages
+
+    def get_messages_after(self, message_id=None) -> list[tuple]:
+        """
+        Returns the (ID, message) pairs stored after a message, oldest first.
+        """
+        query = {self.session_id_key: self.session_id}
+        if message_id is not None:
+            query["_id"] = {"$gt": message_id}
+
+        ids, messages = self._load(query)
+        return list(zip(ids, messages))
+
+    def get_recent_messages(self, turns: int = None) -> list[BaseMessage]:
+        """
+        Returns the messages of the most recent turns, without the running summary.
+        """
+        limit = (turns or self.window_turns) * 2
+        _, messages = self._load({self.session_id_key: self.session_id}, newest_first=True, limit=limit)
+        return messages
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        state = chat_summarizer.get_state(self.user_id, self.chat_id)
+
+        query = {self.session_id_key: self.session_id}
+        if state.get("last_summarized_id") is not None:
+            query["_id"] = {"$gt": state["last_summarized_id"]}
+
+        # Unsummarized turns never exceed one summary step past the window unless updates fail
+        limit = (self.window_turns + PROCESSING_STEP) * 2
+        _, messages = self._load(query, newest_first=True, limit=limit)
+
+        if state.get("rolling_summary"):
+            messages.insert(0, SystemMessage(content=f"Summary of the earlier conversation:\n{state['rolling_summary']}"))
+        return messages
+
+    def add_messages(self, messages: list[BaseMessage]) -> None:
+        super().add_messages(messages)
+
+        if self.llm is not None and self.chat_id is not None:
+            chat_summarizer.schedule_update(self, self.llm)
+
+
+"""Step 5: Create the shared summarizer"""
+chat_summarizer = ChatSummarizer()
+register_metrics_source("chat_summarizer", chat_summarizer.stats)
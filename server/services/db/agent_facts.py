@@ -1,6 +1,8 @@
 """This module is responsible for loading agent facts to the database."""
 """STEP 1: Import required libraries"""
 from services.azure_mongodb import MongoDBClient
+from services.vector_store_registry import vector_store_registry
+from services.agent_facts_index import agent_facts_index
 from models.agent_fact import AgentFact
 from utils.consts import AGENT_FACTS
 
@@ -9,12 +11,22 @@ def load_agent_facts_to_db():
     db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
     collection = db["agent_facts"]
 
-    if collection.count_documents({}) == 0:
-        print("There are no documents in Agent Facts. writing documents...")
-        validated_models: list[AgentFact] = [
-            AgentFact.model_validate(fact_dict) for fact_dict in AGENT_FACTS]
-        facts_to_load = [AgentFact.model_dump(
-            fact_model) for fact_model in validated_models]
-        collection.insert_many(facts_to_load)
-    else:
-        print("Agent facts are already populated. Skipping step.")
\ No newline at end of file
+    validated_models: list[AgentFact] = [
+        AgentFact.model_validate(fact_dict) for fact_dict in AGENT_FACTS]
+    facts_to_load = [AgentFact.model_dump(
+        fact_model) for fact_model in validated_models]
+
+    stored_facts = list(collection.find({}, {"_id": 0, "sample_query": 1, "fact": 1}))
+    fact_key = lambda fact: (fact.get("sample_query", ""), fact.get("fact", ""))
+
+    if sorted(map(fact_key, stored_facts)) == sorted(map(fact_key, facts_to_load)):
+        print("Agent facts are already up to date. Skipping step.")
+        return
+
+    print("Agent facts are missing or outdated. writing documents...")
+    collection.delete_many({})
+    collection.insert_many(facts_to_load)
+    # The cached retriever and in-memory index were built from the previous contents;
+    # the vector store itself is re-indexed incrementally on the next build
+    vector_store_registry.invalidate("agent_facts")
+    agent_facts_index.invalidate()
@@ -1,11 +1,10 @@
 """This module contains functions for interacting with the user collection in the MongoDB database."""
 """Step 1: Import necessary modules"""
 from services.azure_mongodb import MongoDBClient
+from services.chat_context import get_active_chat_context
+from services.db.user_repository import user_repository
 import logging
 import json
-from pymongo.collection import ReturnDocument
-from bson.objectid import ObjectId
-from bson.errors import InvalidId
 
 
 logging.basicConfig(level=logging.INFO)
@@ -15,12 +14,7 @@ db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
 """Step 2: Define the functions"""
 def save_user(db, user_data):
     try:
-        result = db['users'].find_one_and_update(
-            {"username": user_data['username']},
-            {"$set": user_data},
-            upsert=True,
-            return_document=ReturnDocument.AFTER
-        )
+        result = user_repository.save(user_data)
         logger.info("User saved or updated.")
         return result
     except Exception as e:
@@ -32,13 +26,14 @@ def get_user_profile_by_user_id(user_id: str) -> str:
     Retrieves a user's profile information by the user's ID to be used when brought up in conversation.
     Includes age, name and location. Exclude if user ID is `0`, as this indicates it is an anonymous user.
     """
-    try:
-        user_objectid = ObjectId(user_id)
-    except InvalidId as e:
-        logger.error(f"Invalid user ID: {str(e)}")
-        return ""
+    # Reuse the profile loaded with the chat context of the current request
+    chat_context = get_active_chat_context(user_id)
+    if chat_context is not None:
+        if chat_context.user_profile is None:
+            return ""
+        return json.dumps(chat_context.user_profile, default=str)
 
-    doc = db["users"].find_one({"_id": user_objectid}, {"password": 0, "email": 0})
-    if "contentVector" in doc:
-        del doc["contentVector"]
+    doc = user_repository.get_profile(user_id)
+    if doc is None:
+        return ""
     return json.dumps(doc, default=str)
\ No newline at end of file
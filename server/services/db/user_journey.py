@@ -2,6 +2,7 @@
 """Step 1: Import necessary modules"""
 from models.user_journey import UserJourney
 from services.azure_mongodb import MongoDBClient
+from services.chat_context import get_active_chat_context
 from pydantic import ValidationError
 import logging
 
@@ -14,7 +15,13 @@ def get_user_journey_by_user_id(user_id: str) -> UserJourney:
     """
     Retrieves the user's journey information, including mental health concerns, goals, and therapy plans, by the user's ID.
     """
-    doc = db["user_journeys"].find_one({"user_id": user_id})
+    # Reuse the journey loaded with the chat context of the current request
+    chat_context = get_active_chat_context(user_id)
+    if chat_context is not None:
+        doc = dict(chat_context.user_journey) if chat_context.user_journey else None
+    else:
+        doc = db["user_journeys"].find_one({"user_id": user_id})
+
     if doc:
         # Convert strings in mental_health_concerns to MentalHealthConcern instances
         concerns = doc.get('mental_health_concerns', [])
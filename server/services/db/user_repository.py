@@ -0,0 +1,142 @@
+"""This module contains the repository used to read and write documents of the users collection."""
+"""Step 1: Import necessary modules"""
+import logging
+import threading
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from cachetools import TTLCache
+from pymongo.collection import ReturnDocument
+from models.user import User
+from services.azure_mongodb import MongoDBClient
+from utils.consts import USER_PROFILE_CACHE_SIZE, USER_PROFILE_CACHE_TTL_SECONDS
+from utils.metrics import register_metrics_source
+
+logger = logging.getLogger(__name__)
+
+# Fields read for each use case, so that password hashes and embeddings are only read where needed
+USER_PROJECTIONS = {
+    "auth": {"username": 1, "email": 1, "password": 1},
+    "account": {"password": 0, "contentVector": 0},
+    "profile": {"password": 0, "email": 0, "contentVector": 0},
+    "exists": {"_id": 1},
+}
+
+
+"""Step 2: Define the UserRepository class"""
+class UserRepository:
+    """
+    Reads users with a field projection per use case and keeps recently read agent-facing
+    profiles in a short-lived in-process cache that is invalidated on every write.
+    """
+
+    def __init__(self, profile_cache_size: int = USER_PROFILE_CACHE_SIZE, profile_cache_ttl: float = USER_PROFILE_CACHE_TTL_SECONDS):
+        self._profiles = TTLCache(maxsize=profile_cache_size, ttl=profile_cache_ttl)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _get_collection():
+        return MongoDBClient.get_client()[MongoDBClient.get_db_name()]["users"]
+
+    @staticmethod
+    def _to_user(user_data: dict) -> User:
+        if not user_data:
+            return None
+        user_data['id'] = str(user_data.pop('_id'))
+        return User(**user_data)
+
+    def find_by_username(self, username: str, projection: str = "auth") -> User:
+        user_data = self._get_collection().find_one({"username": username}, USER_PROJECTIONS[projection])
+        return self._to_user(user_data)
+
+    def find_by_email(self, email: str, projection: str = "auth") -> User:
+        user_data = self._get_collection().find_one({"email": email}, USER_PROJECTIONS[projection])
+        return self._to_user(user_data)
+
+    def find_by_id(self, user_id: str, projection: str = "account") -> User:
+        user_data = self._get_collection().find_one({"_id": ObjectId(user_id)}, USER_PROJECTIONS[projection])
+        return self._to_user(user_data)
+
+    def exists(self, username: str, email: str) -> bool:
+        """
+        Checks whether a user with the given username or email exists.
+        """
+        query = {"$or": [{"username": username}, {"email": email}]}
+        return self._get_collection().find_one(query, USER_PROJECTIONS["exists"]) is not None
+
+    def get_profile(self, user_id: str) -> dict:
+        """
+        Returns the profile shared with the agent, without credentials or embeddings.
+
+        Args:
+            user_id (str): The ID of the user.
+
+        Returns:
+            dict: The profile, or None if the ID is invalid or unknown.
+        """
+        with self._lock:
+            if user_id in self._profiles:
+                self.hits += 1
+                profile = self._profiles[user_id]
+                return dict(profile) if profile else profile
+            self.misses += 1
+
+        try:
+            user_objectid = ObjectId(user_id)
+        except (InvalidId, TypeError) as e:
+            logger.error(f"Invalid user ID: {str(e)}")
+            return None
+
+        profile = self._get_collection().find_one({"_id": user_objectid}, USER_PROJECTIONS["profile"])
+        with self._lock:
+            self._profiles[user_id] = profile
+        return dict(profile) if profile else profile
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._profiles.pop(str(user_id), None)
+
+    def insert(self, user_data: dict):
+        """
+        Inserts a new user and returns its ID.
+        """
+        result = self._get_collection().insert_one(user_data)
+        self.invalidate(result.inserted_id)
+        return result.inserted_id
+
+    def save(self, user_data: dict) -> dict:
+        """
+        Creates or updates the user with the username in `user_data` and returns the saved document.
+        """
+        result = self._get_collection().find_one_and_update(
+            {"username": user_data['username']},
+            {"$set": user_data},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        self.invalidate(result["_id"])
+        return result
+
+    def update_password(self, username: str, new_hashed_password: str) -> bool:
+        """
+        Sets a user's password hash and returns whether it changed.
+        """
+        # Cached profiles never include the password, so they stay valid
+        result = self._get_collection().update_one({"username": username}, {"$set": {"password": new_hashed_password}})
+        return result.modified_count == 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "size": len(self._profiles),
+            }
+
+
+"""Step 3: Create the shared repository"""
+user_repository = UserRepository()
+register_metrics_source("user_profile_cache", user_repository.stats)
@@ -0,0 +1,253 @@
+"""
+This module extracts the text of uploaded documents in a background process pool, so that
+chat requests reference a document by ID instead of extracting it inline.
+
+Jobs are stored in the `document_extractions` collection, keyed by the SHA-256 of the file,
+so uploading the same file twice reuses the first job.
+"""
+
+"""Step 1: Import necessary modules"""
+# -- Standard libraries --
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+# -- 3rd Party libraries --
+from pymongo.collection import ReturnDocument
+
+# -- Custom modules --
+from services.azure_form_recognizer import PartialText, cache_extraction, extract_text, get_cached_extraction, get_document_id
+from services.azure_mongodb import MongoDBClient
+from utils.consts import EXTRACTION_JOB_STALE_SECONDS, EXTRACTION_WORKERS
+from utils.metrics import register_metrics_source
+
+
+"""Step 2: Define the job statuses"""
+JOB_PROCESSING = "processing"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+# Fields returned by the status endpoint; the text itself is only read by the chat endpoints
+JOB_STATUS_PROJECTION = {"status": 1, "mime_type": 1, "char_count": 1, "partial": 1, "error": 1, "created_at": 1, "updated_at": 1}
+
+
+"""Step 3: Define the DocumentExtractionJobs class"""
+class DocumentExtractionJobs:
+    """
+    Submits document extractions to a process pool and records their status and text in MongoDB.
+
+    A job already processing, or completed, for the same file is reused. A processing job
+    that has not been updated for EXTRACTION_JOB_STALE_SECONDS, for example because the
+    server restarted, is submitted again. If a worker crash broke the pool, a new pool is
+    started and the job is submitted to it once.
+    """
+
+    def __init__(self, collection_name: str = "document_extractions", max_workers: int = EXTRACTION_WORKERS):
+        """
+        Initializes a DocumentExtractionJobs object.
+
+        Args:
+            collection_name (str): The name of the collection storing the jobs.
+            max_workers (int): The number of extraction processes.
+        """
+        self.collection_name = collection_name
+        self.max_workers = max_workers
+        self._executor = None
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "reused": 0, "cache_hits": 0, "completed": 0, "failed": 0, "pool_restarts": 0}
+
+    def _get_collection(self):
+        return MongoDBClient.get_client()[MongoDBClient.get_db_name()][self.collection_name]
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # Workers are spawned rather than forked, as the server process holds client and executor threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _submit_to_pool(self, file_content: bytes, file_mime_type: str):
+        executor = self._get_executor()
+        try:
+            return executor.submit(extract_text, file_content, file_mime_type)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory on a large PDF), which breaks the whole pool
+            logging.warning("The document extraction pool is broken; starting a new one.")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+                self._stats["pool_restarts"] += 1
+            executor.shutdown(wait=False, cancel_futures=True)
+            return self._get_executor().submit(extract_text, file_content, file_mime_type)
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._stats[counter] += 1
+
+    def _complete(self, document_id: str, text: str):
+        now = datetime.now(timezone.utc)
+        partial = isinstance(text, PartialText)
+        self._get_collection().update_one(
+            {"_id": document_id},
+            {
+                "$set": {"status": JOB_COMPLETED, "text": str(text), "char_count": len(text), "partial": partial, "updated_at": now},
+                "$unset": {"error": ""},
+            },
+        )
+
+    def _fail(self, document_id: str, error: str):
+        self._get_collection().update_one(
+            {"_id": document_id},
+            {"$set": {"status": JOB_FAILED, "error": error, "updated_at": datetime.now(timezone.utc)}},
+        )
+
+    def _on_done(self, document_id: str, file_content: bytes, file_mime_type: str, future):
+        with self._lock:
+            self._in_flight.pop(document_id, None)
+
+        try:
+            text = future.result()
+        except Exception as e:
+            # Failures are not cached, so that uploading the file again retries the extraction
+            logging.error(f"Failed to extract the text of document {document_id}: {e}")
+            self._count("failed")
+            try:
+                self._fail(document_id, str(e) or type(e).__name__)
+            except Exception as db_error:
+                logging.error(f"Failed to record the failure of document {document_id}: {db_error}")
+            return
+
+        try:
+            if not isinstance(text, PartialText):
+                cache_extraction(file_content, file_mime_type, text)
+            self._complete(document_id, text)
+            self._count("completed")
+        except Exception as e:
+            logging.error(f"Failed to store the text of document {document_id}: {e}")
+            self._count("failed")
+            try:
+                self._fail(document_id, "The extracted text could not be stored")
+            except Exception as db_error:
+                logging.error(f"Failed to record the failure of document {document_id}: {db_error}")
+
+    def submit(self, file_content: bytes, file_mime_type: str, user_id: str) -> dict:
+        """
+        Starts extracting the text of a file in the background, unless a job for it already exists.
+
+        Args:
+            file_content (bytes): The content of the uploaded file.
+            file_mime_type (str): The MIME type of the uploaded file.
+            user_id (str): The ID of the user uploading the file, who is then allowed to use its text.
+
+        Returns:
+            dict: The `document_id` and `status` of the job.
+        """
+        document_id = get_document_id(file_content)
+        collection = self._get_collection()
+        now = datetime.now(timezone.utc)
+
+        cached_text = get_cached_extraction(file_content, file_mime_type)
+        if cached_text is not None:
+            collection.update_one(
+                {"_id": document_id},
+                {
+                    "$set": {"status": JOB_COMPLETED, "mime_type": file_mime_type, "text": cached_text, "char_count": len(cached_text), "partial": False, "updated_at": now},
+                    "$setOnInsert": {"created_at": now},
+                    "$addToSet": {"user_ids": user_id},
+                    "$unset": {"error": ""},
+                },
+                upsert=True,
+            )
+            self._count("cache_hits")
+            return {"document_id": document_id, "status": JOB_COMPLETED}
+
+        job = collection.find_one_and_update(
+            {"_id": document_id},
+            {
+                "$setOnInsert": {"status": JOB_PROCESSING, "mime_type": file_mime_type, "created_at": now, "updated_at": now},
+                "$addToSet": {"user_ids": user_id},
+            },
+            projection=JOB_STATUS_PROJECTION,
+            upsert=True,
+            return_document=ReturnDocument.BEFORE,
+        )
+
+        if job is not None:
+            updated_at = job.get("updated_at")
+            if updated_at is not None and updated_at.tzinfo is None:
+                updated_at = updated_at.replace(tzinfo=timezone.utc)
+            stale = updated_at is None or now - updated_at > timedelta(seconds=EXTRACTION_JOB_STALE_SECONDS)
+
+            with self._lock:
+                in_flight = document_id in self._in_flight
+            # Jobs that completed with pages missing are run again to retry those pages
+            complete = job["status"] == JOB_COMPLETED and not job.get("partial")
+            if complete or (job["status"] == JOB_PROCESSING and (in_flight or not stale)):
+                self._count("reused")
+                return {"document_id": document_id, "status": job["status"]}
+
+            collection.update_one(
+                {"_id": document_id},
+                {"$set": {"status": JOB_PROCESSING, "mime_type": file_mime_type, "updated_at": now}, "$unset": {"error": ""}},
+            )
+
+        try:
+            future = self._submit_to_pool(file_content, file_mime_type)
+        except Exception as e:
+            # Otherwise uploads of the same file would keep getting a job that never runs
+            self._count("failed")
+            try:
+                self._fail(document_id, f"The extraction could not be started: {e}")
+            except Exception as db_error:
+                logging.error(f"Failed to record the failure of document {document_id}: {db_error}")
+            raise
+
+        with self._lock:
+            self._in_flight[document_id] = future
+            self._stats["submitted"] += 1
+        future.add_done_callback(lambda done: self._on_done(document_id, file_content, file_mime_type, done))
+
+        return {"document_id": document_id, "status": JOB_PROCESSING}
+
+    def get_status(self, document_id: str, user_id: str) -> dict:
+        """
+        Returns the status of a job without its text, or None if the user did not upload the document.
+        """
+        return self._get_collection().find_one({"_id": document_id, "user_ids": user_id}, JOB_STATUS_PROJECTION)
+
+    def get_text(self, document_id: str, user_id: str) -> tuple[str, dict]:
+        """
+        Returns the extracted text of a document uploaded by the user.
+
+        Args:
+            document_id (str): The ID returned when the document was uploaded.
+            user_id (str): The ID of the user.
+
+        Returns:
+            tuple: (text, job). The text is None unless the job completed, and the job is None
+            if the user did not upload the document.
+        """
+        job = self._get_collection().find_one(
+            {"_id": document_id, "user_ids": user_id},
+            {**JOB_STATUS_PROJECTION, "text": 1},
+        )
+        if job is None:
+            return None, None
+
+        text = job.pop("text", None) if job.get("status") == JOB_COMPLETED else None
+        return text, job
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._in_flight)}
+
+
+"""Step 4: Create the shared job runner"""
+document_extraction_jobs = DocumentExtractionJobs()
+register_metrics_source("document_extraction_jobs", document_extraction_jobs.stats)
@@ -0,0 +1,165 @@
+"""
+This module selects which of a user's past chat summaries are injected into the prompt,
+so that the prompt does not grow with the number of past sessions.
+"""
+
+"""Step 1: Import necessary modules"""
+# -- Standard libraries --
+import hashlib
+import logging
+# -- 3rd Party libraries --
+import numpy as np
+from pymongo import UpdateOne
+
+# -- Custom modules --
+from services.azure_mongodb import MongoDBClient
+from services.azure_open_ai import embed_texts, estimate_tokens, get_query_embedding
+from utils.consts import (
+    PAST_SUMMARIES_MAX_CANDIDATES,
+    PAST_SUMMARIES_RECENCY_HALF_LIFE,
+    PAST_SUMMARIES_TOKEN_BUDGET,
+)
+
+
+"""Step 2: Define the summary embedding helpers"""
+SUMMARY_EMBEDDING_KEY = "summary_embedding"
+SUMMARY_HASH_KEY = "summary_hash"
+
+
+def get_summary_hash(summary_text: str) -> str:
+    return hashlib.sha256(summary_text.encode("utf-8")).hexdigest()
+
+
+def load_summary_embeddings(collection, summaries: list[dict]):
+    """
+    Reads the cached embeddings of summaries that were loaded without them.
+
+    Args:
+        collection: The `chat_summaries` collection.
+        summaries (list[dict]): Summary documents, updated in place.
+    """
+    missing = {summary["_id"]: summary for summary in summaries if SUMMARY_EMBEDDING_KEY not in summary}
+    if not missing:
+        return
+
+    cursor = collection.find({"_id": {"$in": list(missing)}}, {SUMMARY_EMBEDDING_KEY: 1, SUMMARY_HASH_KEY: 1})
+    for doc in cursor:
+        summary = missing[doc["_id"]]
+        summary[SUMMARY_EMBEDDING_KEY] = doc.get(SUMMARY_EMBEDDING_KEY)
+        summary[SUMMARY_HASH_KEY] = doc.get(SUMMARY_HASH_KEY)
+
+
+def ensure_summary_embeddings(collection, summaries: list[dict]):
+    """
+    Embeds the summaries whose embedding is missing or stale, and stores the embeddings
+    on their summary documents so that they are computed once per summary text.
+
+    Args:
+        collection: The `chat_summaries` collection.
+        summaries (list[dict]): Summary documents with `summary_text` and the cached embedding fields.
+    """
+    stale = [
+        summary for summary in summaries
+        if not summary.get(SUMMARY_EMBEDDING_KEY) or summary.get(SUMMARY_HASH_KEY) != get_summary_hash(summary["summary_text"])
+    ]
+    if not stale:
+        return
+
+    embeddings = embed_texts([summary["summary_text"] for summary in stale])
+
+    updates = []
+    for summary, embedding in zip(stale, embeddings):
+        summary[SUMMARY_EMBEDDING_KEY] = embedding
+        summary[SUMMARY_HASH_KEY] = get_summary_hash(summary["summary_text"])
+        updates.append(UpdateOne(
+            {"_id": summary["_id"]},
+            {"$set": {SUMMARY_EMBEDDING_KEY: embedding, SUMMARY_HASH_KEY: summary[SUMMARY_HASH_KEY]}},
+        ))
+
+    try:
+        collection.bulk_write(updates, ordered=False)
+    except Exception as e:
+        logging.warning(f"Failed to cache summary embeddings: {e}")
+
+
+"""Step 3: Define the past summary selector"""
+def rank_summaries(summaries: list[dict], query: str) -> list[dict]:
+    """
+    Orders summaries by a blend of similarity to the query and recency.
+
+    Args:
+        summaries (list[dict]): Summary documents, most recent first.
+        query (str): The user's current input. When empty or None, summaries are ranked by recency only.
+    """
+    query = query or ""
+    if not query.strip():
+        return list(summaries)
+
+    # Recency halves every PAST_SUMMARIES_RECENCY_HALF_LIFE sessions
+    recency = 0.5 ** (np.arange(len(summaries)) / PAST_SUMMARIES_RECENCY_HALF_LIFE)
+    matrix = np.asarray([summary[SUMMARY_EMBEDDING_KEY] for summary in summaries], dtype=np.float32)
+    query_vector = np.asarray(get_query_embedding(query), dtype=np.float32)
+
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vector)
+    norms[norms == 0] = 1.0
+    similarity = (matrix @ query_vector) / norms
+
+    scores = 0.7 * similarity + 0.3 * recency
+    return [summaries[i] for i in np.argsort(-scores, kind="stable")]
+
+
+def select_past_summaries(user_id: str, query: str, token_budget: int = PAST_SUMMARIES_TOKEN_BUDGET, summaries: list[dict] = None) -> str:
+    """
+    Returns the past summaries most relevant to the current input that fit in a token budget.
+
+    Only the PAST_SUMMARIES_MAX_CANDIDATES most recent sessions are considered. Selected
+    summaries are returned most recent first.
+
+    Args:
+        user_id (str): The ID of the user.
+        query (str): The user's current input, or None.
+        token_budget (int): The maximum number of tokens of the returned text.
+        summaries (list[dict]): The user's most recent summary documents, most recent first,
+            if they were already loaded. Read from the database otherwise. Their embeddings are
+            read separately, and only when there is a query to rank them by.
+    """
+    # File-only chat turns have no prompt
+    query = query or ""
+
+    db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
+    collection = db["chat_summaries"]
+
+    if summaries is None:
+        cursor = collection.find(
+            {"user_id": user_id, "summary_text": {"$nin": ["", None]}},
+            {"chat_id": 1, "summary_text": 1, SUMMARY_EMBEDDING_KEY: 1, SUMMARY_HASH_KEY: 1},
+        ).sort("chat_id", -1).limit(PAST_SUMMARIES_MAX_CANDIDATES)
+        summaries = list(cursor)
+    else:
+        summaries = [summary for summary in summaries[:PAST_SUMMARIES_MAX_CANDIDATES] if summary.get("summary_text")]
+
+    if not summaries:
+        return ""
+
+    if query.strip():
+        try:
+            load_summary_embeddings(collection, summaries)
+            ensure_summary_embeddings(collection, summaries)
+        except Exception as e:
+            logging.warning(f"Ranking past summaries by recency only: {e}")
+            query = ""
+
+    # Without a query the summaries are already in recency order, so there is nothing to score
+    ranked = rank_summaries(summaries, query) if query.strip() else summaries
+
+    selected = []
+    used_tokens = 0
+    for summary in ranked:
+        tokens = estimate_tokens(summary["summary_text"])
+        if used_tokens + tokens > token_budget:
+            continue
+        selected.append(summary)
+        used_tokens += tokens
+
+    selected.sort(key=lambda summary: summary["chat_id"], reverse=True)
+    return "\n".join(summary["summary_text"] for summary in selected)
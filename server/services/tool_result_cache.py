@@ -0,0 +1,169 @@
+"""
+This module caches the results of agent tools that call external APIs, so that
+near-identical questions do not hit the same upstream API again.
+"""
+
+"""Step 1: Import necessary modules"""
+# -- Standard libraries --
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+# -- 3rd Party libraries --
+from cachetools import LRUCache
+
+# -- Custom modules --
+from services.azure_mongodb import MongoDBClient
+from utils.consts import TOOL_RESULT_CACHE_MAX_ENTRIES
+from utils.metrics import register_metrics_source
+
+
+"""Step 2: Define the ToolResultCache class"""
+class ToolResultCache:
+    """
+    A two-tier cache of tool results: an in-process LRU tier backed by a Mongo collection
+    whose entries are removed by a TTL index.
+
+    Keys are built from the tool name and its normalized arguments, so queries that only
+    differ in case or whitespace share an entry.
+    """
+
+    def __init__(self, collection_name: str = "tool_result_cache", max_entries: int = TOOL_RESULT_CACHE_MAX_ENTRIES):
+        """
+        Initializes a ToolResultCache object.
+
+        Args:
+            collection_name (str): The name of the Mongo collection backing the cache.
+            max_entries (int): The number of entries kept in memory.
+        """
+        self.collection_name = collection_name
+        self._memory = LRUCache(maxsize=max_entries)
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._collection = None
+
+    def _get_collection(self):
+        if self._collection is None:
+            db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
+            collection = db[self.collection_name]
+            collection.create_index("expires_at", expireAfterSeconds=0)
+            self._collection = collection
+        return self._collection
+
+    def _count(self, tool_name: str, counter: str):
+        with self._lock:
+            stats = self._stats.setdefault(tool_name, {"memory_hits": 0, "store_hits": 0, "misses": 0})
+            stats[counter] += 1
+
+    @staticmethod
+    def _normalize(value):
+        if isinstance(value, str):
+            return " ".join(value.lower().split())
+        return value
+
+    def make_key(self, tool_name: str, arguments: dict) -> str:
+        normalized = {name: self._normalize(value) for name, value in arguments.items()}
+        payload = json.dumps({"tool": tool_name, "arguments": normalized}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, tool_name: str, key: str):
+        """
+        Returns a cached result, or None if there is no live entry for the key.
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self._count(tool_name, "memory_hits")
+                return value
+
+        try:
+            doc = self._get_collection().find_one(
+                {"_id": key, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+                {"value": 1, "expires_at": 1},
+            )
+        except Exception as e:
+            logging.warning(f"Tool result cache lookup failed: {e}")
+            doc = None
+
+        if doc is None:
+            self._count(tool_name, "misses")
+            return None
+
+        expires_at = doc["expires_at"]
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        with self._lock:
+            self._memory[key] = (expires_at.timestamp(), doc["value"])
+        self._count(tool_name, "store_hits")
+        return doc["value"]
+
+    def set(self, tool_name: str, key: str, value, ttl: float):
+        """
+        Stores a result in both tiers for `ttl` seconds.
+        """
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+        with self._lock:
+            self._memory[key] = (expires_at.timestamp(), value)
+
+        try:
+            self._get_collection().update_one(
+                {"_id": key},
+                {"$set": {"tool": tool_name, "value": value, "expires_at": expires_at}},
+                upsert=True,
+            )
+        except Exception as e:
+            logging.warning(f"Tool result cache write failed: {e}")
+
+    def wrap(self, tool_name: str, func, ttl: float, uncacheable_results=()):
+        """
+        Returns a version of a tool function whose results are cached for `ttl` seconds.
+
+        Empty results and the given error messages are not cached.
+
+        Args:
+            tool_name (str): The name of the tool.
+            func (callable): The tool function.
+            ttl (float): The number of seconds to cache results for.
+            uncacheable_results (iterable): Results that signal a failure and must not be cached.
+        """
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def cached_func(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = self.make_key(tool_name, bound.arguments)
+
+            result = self.get(tool_name, key)
+            if result is not None:
+                return result
+
+            result = func(*args, **kwargs)
+            if result and isinstance(result, (str, list, dict)) and not (isinstance(result, str) and result in uncacheable_results):
+                self.set(tool_name, key, result, ttl)
+            return result
+
+        return cached_func
+
+    def stats(self) -> dict:
+        """
+        Returns hit and miss counters per tool.
+        """
+        with self._lock:
+            stats = {}
+            for tool_name, counters in self._stats.items():
+                lookups = sum(counters.values())
+                hits = counters["memory_hits"] + counters["store_hits"]
+                stats[tool_name] = {**counters, "hit_rate": (hits / lookups) if lookups else 0.0}
+            return stats
+
+
+"""Step 3: Create the tool result cache"""
+tool_result_cache = ToolResultCache()
+register_metrics_source("tool_result_cache", tool_result_cache.stats)
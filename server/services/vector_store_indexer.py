@@ -0,0 +1,211 @@
+"""
+This module keeps the `*_vector_store` collections in sync with their source collections.
+
+Every chunk stored in a vector store carries a hash of its content, so re-indexing only
+embeds new or changed chunks and deletes chunks whose source content no longer exists.
+
+Usage:
+    python -m services.vector_store_indexer agent_facts
+"""
+
+"""Step 1: Import necessary modules"""
+# -- Standard libraries --
+import argparse
+import hashlib
+import json
+import logging
+# -- 3rd Party libraries --
+from langchain_community.vectorstores.azure_cosmos_db import (
+    AzureCosmosDBVectorSearch,
+    CosmosDBSimilarityType,
+    CosmosDBVectorSearchType,
+)
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain.schema import Document
+
+# -- Custom modules --
+from services.azure_mongodb import MongoDBClient
+from services.azure_open_ai import get_azure_openai_embeddings, stream_embeddings
+
+
+"""Step 2: Define the vector store settings"""
+# The name the vector search index was created under on existing deployments
+VECTOR_STORE_INDEX_NAME = "vectorSearchIndex"
+VECTOR_STORE_EMBEDDING_KEY = "vectorContent"
+VECTOR_STORE_TEXT_KEY = "textContent"
+VECTOR_STORE_HASH_KEY = "contentHash"
+
+# Describes how documents of each source collection are turned into chunks
+VECTOR_STORE_SOURCES = {
+    "agent_facts": {
+        "text_key": "fact",
+        "metadata_keys": ["sample_query"],
+    },
+}
+
+
+def get_vector_store_name(collection_name: str) -> str:
+    return f"{collection_name}_vector_store"
+
+
+def create_vector_store(collection_name: str, embedding_model) -> AzureCosmosDBVectorSearch:
+    """
+    Returns a vector store over a collection's `*_vector_store` collection on the shared client.
+
+    Args:
+        collection_name: The name of the source collection.
+        embedding_model: The embeddings model used to embed documents and queries.
+    """
+    db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
+
+    return AzureCosmosDBVectorSearch(
+        collection=db[get_vector_store_name(collection_name)],
+        embedding=embedding_model,
+        index_name=VECTOR_STORE_INDEX_NAME,
+        text_key=VECTOR_STORE_TEXT_KEY,
+        embedding_key=VECTOR_STORE_EMBEDDING_KEY,
+    )
+
+
+def get_content_hash(chunk: Document) -> str:
+    payload = json.dumps({"text": chunk.page_content, "metadata": chunk.metadata}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+"""Step 3: Define the indexing functions"""
+def load_source_chunks(collection_name: str) -> list[Document]:
+    """
+    Loads the documents of a source collection and splits them into chunks.
+
+    Args:
+        collection_name: The name of the source collection.
+    """
+    source = VECTOR_STORE_SOURCES.get(collection_name)
+    if source is None:
+        raise ValueError(f"No vector store source is defined for collection '{collection_name}'.")
+
+    db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
+    documents = list(db[collection_name].find({}))
+    logging.info(f"Loaded {len(documents)} documents from collection '{collection_name}'.")
+
+    # Create LangChain Document objects
+    docs = []
+    for doc in documents:
+        page_content = doc.get(source["text_key"], '')
+        metadata = {key: doc.get(key, '') for key in source["metadata_keys"]}
+        if page_content.strip():  # Ensure there's content
+            docs.append(Document(page_content=page_content, metadata=metadata))
+
+    # Split the documents
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000,
+        chunk_overlap=20,
+        length_function=len,
+        is_separator_regex=False,
+    )
+
+    chunks = text_splitter.split_documents(docs)
+    logging.info(f"Split {len(docs)} documents into {len(chunks)} chunks.")
+    return chunks
+
+
+def index_collection(collection_name: str, vector_store: AzureCosmosDBVectorSearch = None, embedding_model=None) -> dict:
+    """
+    Brings a collection's vector store up to date with its source documents.
+
+    Only chunks whose content hash is not yet stored are embedded. Stored chunks
+    whose hash no longer matches any source chunk are deleted.
+
+    Args:
+        collection_name: The name of the source collection.
+        vector_store: The vector store to update. Created on the shared client if omitted.
+        embedding_model: The embeddings model to use if `vector_store` is omitted.
+
+    Returns:
+        dict: How many chunks were reused, embedded and deleted.
+    """
+    if vector_store is None:
+        vector_store = create_vector_store(collection_name, embedding_model or get_azure_openai_embeddings())
+    db = MongoDBClient.get_client()[MongoDBClient.get_db_name()]
+    vector_store_collection = db[get_vector_store_name(collection_name)]
+
+    chunks_by_hash = {}
+    for chunk in load_source_chunks(collection_name):
+        chunks_by_hash.setdefault(get_content_hash(chunk), chunk)
+
+    stored_ids_by_hash = {}
+    orphan_ids = []
+    for doc in vector_store_collection.find({}, {VECTOR_STORE_HASH_KEY: 1}):
+        content_hash = doc.get(VECTOR_STORE_HASH_KEY)
+        # Chunks indexed without a hash, duplicates and stale chunks are removed
+        if content_hash in chunks_by_hash and content_hash not in stored_ids_by_hash:
+            stored_ids_by_hash[content_hash] = doc["_id"]
+        else:
+            orphan_ids.append(doc["_id"])
+
+    new_hashes = [content_hash for content_hash in chunks_by_hash if content_hash not in stored_ids_by_hash]
+
+    if new_hashes:
+        new_chunks = [chunks_by_hash[content_hash] for content_hash in new_hashes]
+        # Store each batch as soon as it is embedded
+        for indices, embeddings in stream_embeddings([chunk.page_content for chunk in new_chunks]):
+            vector_store_collection.insert_many([
+                {
+                    VECTOR_STORE_TEXT_KEY: new_chunks[i].page_content,
+                    VECTOR_STORE_EMBEDDING_KEY: embedding,
+                    VECTOR_STORE_HASH_KEY: new_hashes[i],
+                    **new_chunks[i].metadata,
+                }
+                for i, embedding in zip(indices, embeddings)
+            ])
+
+    if orphan_ids:
+        vector_store_collection.delete_many({"_id": {"$in": orphan_ids}})
+
+    if chunks_by_hash and not vector_store.index_exists():
+        num_lists = 1
+        dimensions = 1536
+        similarity_algorithm = CosmosDBSimilarityType.COS
+        kind = CosmosDBVectorSearchType.VECTOR_IVF
+        m = 16
+        ef_construction = 64
+
+        vector_store.create_index(
+            num_lists, dimensions, similarity_algorithm, kind, m, ef_construction
+        )
+        logging.info("Vector store index created successfully.")
+
+    report = {
+        "collection": collection_name,
+        "chunks": len(chunks_by_hash),
+        "reused": len(stored_ids_by_hash),
+        "embedded": len(new_hashes),
+        "deleted": len(orphan_ids),
+    }
+    logging.info(f"Indexed '{collection_name}': {report}")
+    return report
+
+
+"""Step 4: Define the command line entry point"""
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incrementally re-index *_vector_store collections.")
+    parser.add_argument(
+        "collections",
+        nargs="*",
+        default=list(VECTOR_STORE_SOURCES),
+        help="Source collections to index (default: all known sources).",
+    )
+    args = parser.parse_args(argv)
+
+    embedding_model = get_azure_openai_embeddings()
+    for collection_name in args.collections:
+        report = index_collection(collection_name, embedding_model=embedding_model)
+        print(
+            f"{collection_name}: {report['chunks']} chunks, "
+            f"{report['reused']} embeddings reused, {report['embedded']} recomputed, "
+            f"{report['deleted']} orphans deleted"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+This module keeps a process-wide registry of Azure Cosmos DB vector stores keyed by
+source collection name, so that agents do not probe or reconnect to the database
+every time they are built.
+"""
+
+"""Step 1: Import necessary modules"""
+# -- Standard libraries --
+import logging
+import threading
+import time
+# -- 3rd Party libraries --
+from langchain_community.vectorstores.azure_cosmos_db import AzureCosmosDBVectorSearch
+from langchain_core.vectorstores import VectorStoreRetriever
+
+# -- Custom modules --
+from services.azure_open_ai import get_azure_openai_embeddings
+from services.vector_store_indexer import create_vector_store, index_collection
+from utils.metrics import register_metrics_source
+
+
+"""Step 2: Define the vector store helpers"""
+def build_vector_store(collection_name: str, embedding_model) -> AzureCosmosDBVectorSearch:
+    """
+    Loads the vector store for a collection after bringing it up to date with its source documents.
+
+    Args:
+        collection_name: The name of the source collection.
+        embedding_model: The embeddings model used to embed documents and queries.
+    """
+    vector_store = create_vector_store(collection_name, embedding_model)
+    report = index_collection(collection_name, vector_store)
+
+    if not report["chunks"]:
+        logging.error(f"No documents to index for '{collection_name}'. Exiting vector store creation.")
+        return None
+
+    return vector_store
+
+
+"""Step 3: Define the VectorStoreRegistry class"""
+class VectorStoreRegistry:
+    """
+    Caches one vector store per source collection for the lifetime of the process.
+
+    Entries are only rebuilt after `invalidate` is called for their collection,
+    which happens when the source collection is rewritten.
+    """
+
+    def __init__(self):
+        self._vector_stores = {}
+        self._build_seconds = {}
+        self._build_locks = {}
+        self._lock = threading.Lock()
+        self._embedding_model = None
+        self.hits = 0
+        self.misses = 0
+
+    def _get_embedding_model(self):
+        if self._embedding_model is None:
+            self._embedding_model = get_azure_openai_embeddings()
+        return self._embedding_model
+
+    def get_vector_store(self, collection_name: str, embedding_model=None) -> AzureCosmosDBVectorSearch:
+        """
+        Returns the cached vector store for a collection, building it on first use.
+
+        Args:
+            collection_name: The name of the source collection.
+            embedding_model: The embeddings model to use if the vector store has to be built.
+        """
+        with self._lock:
+            vector_store = self._vector_stores.get(collection_name)
+            if vector_store is not None:
+                self.hits += 1
+                return vector_store
+            build_lock = self._build_locks.setdefault(collection_name, threading.Lock())
+
+        # Builds embed documents and can take a while, so only lookups of the same collection wait for them
+        with build_lock:
+            with self._lock:
+                vector_store = self._vector_stores.get(collection_name)
+                if vector_store is not None:
+                    self.hits += 1
+                    return vector_store
+                self.misses += 1
+
+            started = time.perf_counter()
+            vector_store = build_vector_store(collection_name, embedding_model or self._get_embedding_model())
+
+            with self._lock:
+                self._build_seconds[collection_name] = time.perf_counter() - started
+                if vector_store is not None:
+                    self._vector_stores[collection_name] = vector_store
+            return vector_store
+
+    def get_retriever(self, collection_name: str, top_k: int = 3, embedding_model=None) -> VectorStoreRetriever:
+        """
+        Returns a retriever over the cached vector store for a collection.
+
+        Args:
+            collection_name: The name of the source collection.
+            top_k: The number of similar documents to retrieve.
+            embedding_model: The embeddings model to use if the vector store has to be built.
+        """
+        vector_store = self.get_vector_store(collection_name, embedding_model)
+        if vector_store is None:
+            return None
+        return vector_store.as_retriever(search_kwargs={"k": top_k})
+
+    def warm(self, collection_names: list[str]):
+        """
+        Builds the vector stores for the given collections ahead of the first request.
+
+        Args:
+            collection_names: The names of the source collections.
+        """
+        for collection_name in collection_names:
+            self.get_vector_store(collection_name)
+
+    def invalidate(self, collection_name: str):
+        """
+        Drops the cached vector store of a collection whose source documents changed.
+
+        Args:
+            collection_name: The name of the source collection.
+        """
+        with self._lock:
+            self._vector_stores.pop(collection_name, None)
+        logging.info(f"Invalidated cached vector store for '{collection_name}'.")
+
+    def stats(self) -> dict:
+        """
+        Returns the registry's hit rate and the build time of each vector store.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+                "collections": sorted(self._vector_stores),
+                "build_seconds": dict(self._build_seconds),
+            }
+
+
+"""Step 4: Create the process-wide registry"""
+vector_store_registry = VectorStoreRegistry()
+register_metrics_source("vector_store_registry", vector_store_registry.stats)
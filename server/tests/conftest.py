@@ -0,0 +1,14 @@
+"""Shared test setup: makes the server's packages importable when pytest runs from any directory."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The agent tools build their API clients at import time; tests never call the APIs
+for name, value in {
+    "AZURE_TEXT_ANALYTICS_KEY": "test",
+    "AZURE_TEXT_ANALYTICS_ENDPOINT": "https://text-analytics.invalid",
+    "TAVILY_API_KEY": "test",
+    "GPLACES_API_KEY": "AIzatest",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,62 @@
+"""Tests for the document extractors."""
+import re
+import zipfile
+from io import BytesIO
+
+import openpyxl
+
+import services.azure_form_recognizer as azure_form_recognizer
+
+
+LOCAL_PAGE = "A born-digital page with a usable text layer."
+
+
+def test_extract_text_from_pdf_keeps_local_pages_when_ocr_fails(monkeypatch):
+    monkeypatch.setattr(azure_form_recognizer, "extract_pdf_text_layer", lambda file_content: [LOCAL_PAGE, "", LOCAL_PAGE])
+
+    def fail(file_content, pages=None):
+        raise RuntimeError("Form Recognizer is unavailable")
+
+    monkeypatch.setattr(azure_form_recognizer, "analyze_with_form_recognizer", fail)
+
+    text = azure_form_recognizer.extract_text_from_pdf(b"%PDF")
+
+    assert text == f"{LOCAL_PAGE}\n\n{LOCAL_PAGE}\n"
+    assert isinstance(text, azure_form_recognizer.PartialText)
+
+
+def test_partial_text_is_not_cached(monkeypatch):
+    monkeypatch.setattr(azure_form_recognizer, "get_cached_extraction", lambda file_content, file_mime_type: None)
+    monkeypatch.setattr(azure_form_recognizer, "extract_text", lambda file_content, file_mime_type: azure_form_recognizer.PartialText(LOCAL_PAGE))
+
+    cached = []
+    monkeypatch.setattr(azure_form_recognizer, "cache_extraction", lambda *args: cached.append(args))
+
+    assert azure_form_recognizer.extract_text_from_file(b"%PDF", "application/pdf") == LOCAL_PAGE
+    assert cached == []
+
+
+def build_xlsx_with_wrong_dimension(rows):
+    workbook = openpyxl.Workbook()
+    for row in rows:
+        workbook.active.append(row)
+    buffer = BytesIO()
+    workbook.save(buffer)
+
+    # Rewrite the sheet's <dimension> tag the way many non-Excel writers leave it
+    patched = BytesIO()
+    with zipfile.ZipFile(BytesIO(buffer.getvalue())) as source, zipfile.ZipFile(patched, "w") as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename == "xl/worksheets/sheet1.xml":
+                data = re.sub(rb'<dimension ref="[^"]*"', b'<dimension ref="A1"', data)
+            target.writestr(item, data)
+    return patched.getvalue()
+
+
+def test_extract_text_from_xlsx_ignores_wrong_dimension_tag():
+    rows = [[f"row {i}", i] for i in range(10)]
+
+    text = azure_form_recognizer.extract_text_from_xlsx(build_xlsx_with_wrong_dimension(rows))
+
+    assert text.splitlines() == [f"row {i}\t{i}" for i in range(10)]
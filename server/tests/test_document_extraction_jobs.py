@@ -0,0 +1,99 @@
+"""Tests for the background document extraction jobs."""
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import mongomock
+import pytest
+
+import services.document_extraction_jobs as document_extraction_jobs
+from services.document_extraction_jobs import JOB_COMPLETED, JOB_FAILED, JOB_PROCESSING, DocumentExtractionJobs
+
+
+FILE_CONTENT = b"%PDF-1.7 lecture notes"
+PDF = "application/pdf"
+
+
+class FakeMongoDBClient:
+    client = None
+
+    @classmethod
+    def get_client(cls):
+        return cls.client
+
+    @staticmethod
+    def get_db_name():
+        return "test"
+
+
+class InlineExecutor:
+    """Runs submitted calls immediately, in the calling thread."""
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class BrokenExecutor(InlineExecutor):
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, func, *args):
+        raise BrokenProcessPool("A worker died")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+class FailingExecutor(InlineExecutor):
+    def submit(self, func, *args):
+        raise RuntimeError("Cannot start a worker")
+
+
+@pytest.fixture
+def jobs(monkeypatch):
+    FakeMongoDBClient.client = mongomock.MongoClient()
+    monkeypatch.setattr(document_extraction_jobs, "MongoDBClient", FakeMongoDBClient)
+    monkeypatch.setattr(document_extraction_jobs, "get_cached_extraction", lambda file_content, file_mime_type: None)
+    monkeypatch.setattr(document_extraction_jobs, "cache_extraction", lambda *args: None)
+    monkeypatch.setattr(document_extraction_jobs, "extract_text", lambda file_content, file_mime_type: "Lecture notes")
+    return DocumentExtractionJobs()
+
+
+def test_broken_pool_is_replaced_and_the_job_resubmitted(jobs, monkeypatch):
+    broken = BrokenExecutor()
+    jobs._executor = broken
+    monkeypatch.setattr(document_extraction_jobs, "ProcessPoolExecutor", lambda **kwargs: InlineExecutor())
+
+    job = jobs.submit(FILE_CONTENT, PDF, "user")
+
+    assert broken.shut_down
+    assert jobs.stats()["pool_restarts"] == 1
+    text, stored_job = jobs.get_text(job["document_id"], "user")
+    assert (text, stored_job["status"]) == ("Lecture notes", JOB_COMPLETED)
+
+
+def test_failed_submit_marks_the_job_failed(jobs):
+    jobs._executor = FailingExecutor()
+
+    with pytest.raises(RuntimeError):
+        jobs.submit(FILE_CONTENT, PDF, "user")
+
+    document_id = document_extraction_jobs.get_document_id(FILE_CONTENT)
+    assert jobs.get_status(document_id, "user")["status"] == JOB_FAILED
+
+    # The next upload of the same file runs the extraction again
+    jobs._executor = InlineExecutor()
+    assert jobs.submit(FILE_CONTENT, PDF, "user")["status"] == JOB_PROCESSING
+    assert jobs.get_status(document_id, "user")["status"] == JOB_COMPLETED
+
+
+def test_status_is_only_visible_to_uploaders(jobs):
+    jobs._executor = InlineExecutor()
+    document_id = jobs.submit(FILE_CONTENT, PDF, "owner")["document_id"]
+
+    assert jobs.get_status(document_id, "owner")["status"] == JOB_COMPLETED
+    assert jobs.get_status(document_id, "someone-else") is None
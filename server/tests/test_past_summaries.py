@@ -0,0 +1,88 @@
+"""Tests for the past summary selector."""
+import pytest
+
+import services.past_summaries as past_summaries
+
+
+class FakeMongoDBClient:
+    """Hands out an in-memory database, so that no summary is read from or written to MongoDB."""
+
+    @staticmethod
+    def get_client():
+        return {"test": {"chat_summaries": None}}
+
+    @staticmethod
+    def get_db_name():
+        return "test"
+
+
+@pytest.fixture
+def summaries():
+    return [
+        {"_id": chat_id, "chat_id": chat_id, "summary_text": f"Summary of chat {chat_id}."}
+        for chat_id in (3, 2, 1)
+    ]
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    monkeypatch.setattr(past_summaries, "MongoDBClient", FakeMongoDBClient)
+    monkeypatch.setattr(past_summaries, "estimate_tokens", lambda text: len(text.split()))
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Summaries must not be embedded without a query")
+
+    monkeypatch.setattr(past_summaries, "embed_texts", fail)
+    monkeypatch.setattr(past_summaries, "get_query_embedding", fail)
+
+
+def test_rank_summaries_without_query_keeps_recency_order(summaries):
+    assert past_summaries.rank_summaries(summaries, None) == summaries
+
+
+def test_select_past_summaries_without_query_uses_recency(summaries):
+    text = past_summaries.select_past_summaries("user", None, summaries=summaries)
+
+    assert text.splitlines() == ["Summary of chat 3.", "Summary of chat 2.", "Summary of chat 1."]
+
+
+def test_select_past_summaries_without_query_respects_token_budget(summaries):
+    text = past_summaries.select_past_summaries("user", None, token_budget=8, summaries=summaries)
+
+    assert text.splitlines() == ["Summary of chat 3.", "Summary of chat 2."]
+
+
+class FakeCollection:
+    """Answers `find` with stored embedding fields, and records the IDs that were read."""
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.requested_ids = []
+
+    def find(self, query, projection):
+        self.requested_ids.extend(query["_id"]["$in"])
+        return [doc for doc in self.docs if doc["_id"] in query["_id"]["$in"]]
+
+
+def test_load_summary_embeddings_reads_only_missing_embeddings(summaries):
+    summaries[0][past_summaries.SUMMARY_EMBEDDING_KEY] = [1.0, 0.0]
+    collection = FakeCollection([
+        {"_id": 2, past_summaries.SUMMARY_EMBEDDING_KEY: [0.0, 1.0], past_summaries.SUMMARY_HASH_KEY: "hash"},
+    ])
+
+    past_summaries.load_summary_embeddings(collection, summaries)
+
+    assert collection.requested_ids == [2, 1]
+    assert summaries[1][past_summaries.SUMMARY_EMBEDDING_KEY] == [0.0, 1.0]
+    assert past_summaries.SUMMARY_EMBEDDING_KEY not in summaries[2]
+
+
+def test_select_past_summaries_without_query_skips_scoring(summaries, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("Summaries must not be scored without a query")
+
+    monkeypatch.setattr(past_summaries, "rank_summaries", fail)
+
+    text = past_summaries.select_past_summaries("user", "   ", summaries=summaries)
+
+    assert text.splitlines() == ["Summary of chat 3.", "Summary of chat 2.", "Summary of chat 1."]
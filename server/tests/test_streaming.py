@@ -0,0 +1,91 @@
+"""Tests for consuming the agent's async streams from synchronous views."""
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from agents.agent_pool import AgentPool
+from utils.streaming import iterate_async_generator
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"token"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+class StreamingAgent:
+    """Streams through one async HTTP client for its whole life, as a pooled agent's LLM does."""
+
+    def __init__(self, url, **kwargs):
+        self.url = url
+        self.client = httpx.AsyncClient()
+
+    async def astream(self):
+        response = await self.client.get(self.url)
+        yield {"type": "token", "content": response.text}
+        yield {"type": "done"}
+
+    def reset(self):
+        pass
+
+
+def test_pooled_agent_streams_twice(server_url):
+    pool = AgentPool(lambda **kwargs: StreamingAgent(server_url, **kwargs))
+
+    for _ in range(2):
+        with pool.checkout("educational mentor", []) as agent:
+            events = list(iterate_async_generator(agent.astream()))
+        assert events == [{"type": "token", "content": "token"}, {"type": "done"}]
+
+    assert pool.stats()["hits"] == 1
+
+
+def test_stream_errors_reach_the_caller():
+    async def failing_stream():
+        yield {"type": "token", "content": "partial"}
+        raise ValueError("upstream failed")
+
+    events = iterate_async_generator(failing_stream())
+
+    assert next(events) == {"type": "token", "content": "partial"}
+    with pytest.raises(ValueError, match="upstream failed"):
+        next(events)
+
+
+def test_closing_the_stream_early_stops_the_generator():
+    stopped = []
+
+    async def endless_stream():
+        try:
+            while True:
+                await asyncio.sleep(0)
+                yield {"type": "token", "content": "more"}
+        finally:
+            stopped.append(True)
+
+    events = iterate_async_generator(endless_stream())
+    assert next(events) == {"type": "token", "content": "more"}
+    events.close()
+
+    assert stopped == [True]
@@ -0,0 +1,31 @@
+"""Tests for the study buddy agent's prompt."""
+from langchain_core.messages import SystemMessage
+
+from agents.study_buddy_agent import StudyBuddyAIAgent
+
+
+BRACED_SUMMARY = "We practised set-builder notation such as {x | x > 0} and read {\"a\": 1} as JSON."
+
+
+def build_agent(summary: str) -> StudyBuddyAIAgent:
+    # Only the prompt is built, so no LLM, database or tools are needed
+    agent = StudyBuddyAIAgent.__new__(StudyBuddyAIAgent)
+    agent.base_prompt_messages = [
+        SystemMessage(content="You are a mentor."),
+        ("system", "{past_summaries}"),
+        ("system", "user_id:{user_id}"),
+        ("human", "{input}"),
+    ]
+    agent.system_message = SystemMessage(content=f"You are a mentor.\nPrevious Conversations Summary:\n{summary}")
+    return agent
+
+
+def test_prompt_keeps_braces_in_the_system_message_and_document():
+    agent = build_agent(BRACED_SUMMARY)
+
+    prompt = agent._build_prompt("def f(): return {1, 2}")
+    messages = prompt.format_messages(past_summaries=BRACED_SUMMARY, user_id="user", input="Hi")
+
+    assert set(prompt.input_variables) == {"past_summaries", "user_id", "input"}
+    assert BRACED_SUMMARY in messages[0].content
+    assert "def f(): return {1, 2}" in messages[2].content
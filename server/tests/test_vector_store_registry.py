@@ -0,0 +1,34 @@
+"""Tests for the process-wide vector store registry."""
+import threading
+
+import services.vector_store_registry as vector_store_registry_module
+
+
+def test_build_does_not_block_lookups_of_other_collections(monkeypatch):
+    build_started = threading.Event()
+    release_build = threading.Event()
+
+    def build_vector_store(collection_name, embedding_model):
+        if collection_name == "slow":
+            build_started.set()
+            release_build.wait(5)
+        return f"{collection_name} store"
+
+    monkeypatch.setattr(vector_store_registry_module, "build_vector_store", build_vector_store)
+    registry = vector_store_registry_module.VectorStoreRegistry()
+    registry.get_vector_store("fast", embedding_model=object())
+
+    slow_build = threading.Thread(target=registry.get_vector_store, args=("slow", object()))
+    slow_build.start()
+    assert build_started.wait(5)
+    try:
+        lookup = threading.Thread(target=registry.get_vector_store, args=("fast",))
+        lookup.start()
+        lookup.join(1)
+        assert not lookup.is_alive()
+    finally:
+        release_build.set()
+        slow_build.join(5)
+
+    assert registry.get_vector_store("slow") == "slow store"
+    assert registry.stats()["misses"] == 2
@@ -1,9 +1,15 @@
 """ This module contains the agent functions that interact with the external APIs. """
 """STEP 1: Import necessary modules"""
 import os
+import json
 import random
-import requests
-from langchain_google_community import GoogleSearchAPIWrapper
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import googlemaps
+import httplib2
+from googleapiclient.discovery import build
+from langchain_google_community import GooglePlacesTool, GoogleSearchAPIWrapper
 from langchain_community.utilities import BingSearchAPIWrapper
 from langchain_community.tools import YouTubeSearchTool
 from azure.core.credentials import AzureKeyCredential
@@ -16,15 +22,73 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import inch
 from uuid import uuid4
 import os
+from utils.http_client import http_client
+from utils.disk_cache import DiskCache
+from utils.consts import (
+    HTTP_CONNECT_TIMEOUT_SECONDS,
+    HTTP_READ_TIMEOUT_SECONDS,
+    TEXTBOOK_SEARCH_TOP_N,
+    OPENLIBRARY_SEARCH_CACHE_TTL_SECONDS,
+    OPENLIBRARY_EDITION_CACHE_TTL_SECONDS,
+)
 
 # Initialize Azure Text Analytics Client
 text_analytics_key = os.getenv("AZURE_TEXT_ANALYTICS_KEY")
 text_analytics_endpoint = os.getenv("AZURE_TEXT_ANALYTICS_ENDPOINT")
-text_analytics_client = TextAnalyticsClient(endpoint=text_analytics_endpoint, credential=AzureKeyCredential(text_analytics_key))
+text_analytics_client = TextAnalyticsClient(
+    endpoint=text_analytics_endpoint,
+    credential=AzureKeyCredential(text_analytics_key),
+    connection_timeout=HTTP_CONNECT_TIMEOUT_SECONDS,
+    read_timeout=HTTP_READ_TIMEOUT_SECONDS,
+)
+
+# Open Library responses are cached on disk; edition lookups run concurrently
+openlibrary_cache = DiskCache("openlibrary", default_ttl=OPENLIBRARY_SEARCH_CACHE_TTL_SECONDS)
+edition_lookup_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="openlibrary")
 
 
 """Step 2: Define the agent functions"""
 
+# Messages returned by tools when an upstream API fails; they are never cached
+TEXTBOOK_SEARCH_ERROR_MESSAGE = "Sorry, I couldn't fetch textbooks at the moment."
+JOB_SEARCH_ERROR_MESSAGE = "Sorry, I couldn't fetch job listings at the moment."
+JOB_SEARCH_CREDENTIALS_MESSAGE = "Job search API credentials are not set."
+TOOL_ERROR_MESSAGES = {
+    TEXTBOOK_SEARCH_ERROR_MESSAGE,
+    JOB_SEARCH_ERROR_MESSAGE,
+    JOB_SEARCH_CREDENTIALS_MESSAGE,
+}
+
+# The search wrappers are built once and reused across tool calls
+@lru_cache(maxsize=1)
+def get_google_search_wrapper() -> GoogleSearchAPIWrapper:
+    google_search_wrapper = GoogleSearchAPIWrapper(k=3)
+    # The wrapper's own client waits on its socket without a timeout
+    google_search_wrapper.search_engine = build(
+        "customsearch",
+        "v1",
+        developerKey=google_search_wrapper.google_api_key,
+        http=httplib2.Http(timeout=HTTP_READ_TIMEOUT_SECONDS),
+        cache_discovery=False,
+    )
+    return google_search_wrapper
+
+
+@lru_cache(maxsize=1)
+def get_youtube_search_tool() -> YouTubeSearchTool:
+    return YouTubeSearchTool()
+
+
+def get_google_places_tool() -> GooglePlacesTool:
+    google_places_tool = GooglePlacesTool()
+    # The wrapper's own client sends requests without a timeout
+    google_places_tool.api_wrapper.google_map_client = googlemaps.Client(
+        google_places_tool.api_wrapper.gplaces_api_key,
+        timeout=HTTP_READ_TIMEOUT_SECONDS,
+    )
+    return google_places_tool
+
+
 def get_google_search_results(query: str):
     """
     Uses Google Custom Search to fetch search results for a given query.
@@ -37,7 +101,7 @@ def get_google_search_results(query: str):
     """
 
     try:
-        google_search_wrapper = GoogleSearchAPIWrapper(k=3)
+        google_search_wrapper = get_google_search_wrapper()
         search_results = google_search_wrapper.run(query)
         print("Search results obtained:", search_results)
 
@@ -46,7 +110,7 @@ def get_google_search_results(query: str):
         return search_results
     
     except Exception as e:
-        print(f"Failed to fetch Google search results: {e}", exc_info=True)
+        logging.error(f"Failed to fetch Google search results: {e}", exc_info=True)
         return None
     
 
@@ -64,7 +128,7 @@ def get_youtube_search_results(query: str):
         list: A list of search results with titles, descriptions, and video links.
     """
     try:
-        youtube_search_tool = YouTubeSearchTool()
+        youtube_search_tool = get_youtube_search_tool()
         search_results = youtube_search_tool.run(query)
         print("Search results obtained:", search_results)
 
@@ -72,7 +136,7 @@ def get_youtube_search_results(query: str):
         return search_results
 
     except Exception as e:
-        print(f"Failed to fetch YouTube search results: {e}", exc_info=True)
+        logging.error(f"Failed to fetch YouTube search results: {e}", exc_info=True)
         return None
 
 
@@ -98,7 +162,7 @@ def get_bing_search_results(query: str):
         return search_results
 
     except Exception as e:
-        print(f"Failed to fetch Bing search results: {e}", exc_info=True)
+        logging.error(f"Failed to fetch Bing search results: {e}", exc_info=True)
         return None
     
 
@@ -128,52 +192,92 @@ def generate_suggestions(mood: str, user_input: str):
     return suggestions
 
 
-def get_public_domain_textbooks(query: str):
+def get_cached_json(url: str, params: dict = None, ttl: float = None):
+    """
+    Fetches a JSON response through the shared HTTP client, answering repeated requests from the disk cache.
+
+    Args:
+        url (str): The URL to request.
+        params (dict): The query string parameters.
+        ttl (float): The number of seconds to cache the response for.
+    """
+    key = json.dumps({"url": url, "params": params or {}}, sort_keys=True)
+    data = openlibrary_cache.get(key)
+    if data is None:
+        data = http_client.get_json(url, params=params)
+        openlibrary_cache.set(key, data, ttl=ttl)
+    return data
+
+
+def get_edition_pdf_link(edition_key: str):
+    """
+    Looks up an Open Library edition and returns a PDF link for it, if one is available.
+
+    Args:
+        edition_key (str): The Open Library edition key.
+    """
+    # Fetch edition data to check for available formats
+    edition_data = get_cached_json(
+        f"https://openlibrary.org/books/{edition_key}.json",
+        ttl=OPENLIBRARY_EDITION_CACHE_TTL_SECONDS,
+    )
+    formats = edition_data.get('formats', {})
+
+    # Check if a PDF is available in formats
+    if 'pdf' in formats:
+        return formats['pdf'].get('url')
+
+    # Alternatively, check for Internet Archive links
+    elif 'ocaid' in edition_data:
+        ocaid = edition_data['ocaid']
+        return f"https://archive.org/download/{ocaid}/{ocaid}.pdf"
+
+    return None
+
+
+def get_public_domain_textbooks(query: str, top_n: int = TEXTBOOK_SEARCH_TOP_N):
     """
     Searches for textbooks in public domain libraries based on the user's query.
 
     Args:
         query (str): The search query.
+        top_n (int): The number of search results to return.
 
     Returns:
         str: A formatted string containing the search results with PDF links if available.
     """
     try:
         # Use Open Library Search API
-        search_response = requests.get(
+        search_data = get_cached_json(
             "https://openlibrary.org/search.json",
-            params={"title": query, "has_fulltext": "true"}
+            params={"title": " ".join(query.lower().split()), "has_fulltext": "true"},
+            ttl=OPENLIBRARY_SEARCH_CACHE_TTL_SECONDS,
         )
-        search_data = search_response.json()
-        books = search_data.get("docs", [])[:3]  # Get top 3 results
+        books = search_data.get("docs", [])[:top_n]  # Get top N results
 
         if not books:
             return "No textbooks found for your query."
 
+        # Fetch the edition data of all results concurrently
+        edition_keys = [book.get('edition_key', [None])[0] for book in books]
+        pdf_link_futures = [
+            edition_lookup_executor.submit(get_edition_pdf_link, edition_key) if edition_key else None
+            for edition_key in edition_keys
+        ]
+
         results = "Here are some textbooks you might find useful:\n"
-        for book in books:
+        for book, pdf_link_future in zip(books, pdf_link_futures):
             title = book.get("title", "Unknown Title")
             author = ', '.join(book.get("author_name", ["Unknown Author"]))
             work_key = book.get('key')
-            edition_key = book.get('edition_key', [None])[0]
 
             # Initialize PDF link
             pdf_link = None
-
-            if edition_key:
-                # Fetch edition data to check for available formats
-                edition_response = requests.get(f"https://openlibrary.org/books/{edition_key}.json")
-                edition_data = edition_response.json()
-                formats = edition_data.get('formats', {})
-
-                # Check if a PDF is available in formats
-                if 'pdf' in formats:
-                    pdf_link = formats['pdf'].get('url')
-
-                # Alternatively, check for Internet Archive links
-                elif 'ocaid' in edition_data:
-                    ocaid = edition_data['ocaid']
-                    pdf_link = f"https://archive.org/download/{ocaid}/{ocaid}.pdf"
+            if pdf_link_future is not None:
+                try:
+                    pdf_link = pdf_link_future.result()
+                except Exception as e:
+                    logging.warning(f"Failed to fetch edition data for '{title}': {e}")
 
             # Fallback to the work link if no PDF is available
             if pdf_link:
@@ -189,7 +293,7 @@ def get_public_domain_textbooks(query: str):
 
     except Exception as e:
         print(f"Failed to fetch textbooks: {e}")
-        return "Sorry, I couldn't fetch textbooks at the moment."
+        return TEXTBOOK_SEARCH_ERROR_MESSAGE
     
 
 def get_gutendex_domain_textbooks(query: str):
@@ -204,11 +308,10 @@ def get_gutendex_domain_textbooks(query: str):
     """
     try:
         # Use Project Gutenberg's catalog via a third-party API
-        search_response = requests.get(
-            "http://gutendex.com/books",
+        search_data = http_client.get_json(
+            "https://gutendex.com/books/",
             params={"search": query}
         )
-        search_data = search_response.json()
         books = search_data.get("results", [])[:3]  # Get top 3 results
 
         if not books:
@@ -237,7 +340,7 @@ def get_gutendex_domain_textbooks(query: str):
 
     except Exception as e:
         print(f"Failed to fetch textbooks: {e}")
-        return "Sorry, I couldn't fetch textbooks at the moment."
+        return TEXTBOOK_SEARCH_ERROR_MESSAGE
 
 
 
@@ -319,7 +422,7 @@ def get_job_listings(skills: str, location: str = None):
     ADZUNA_APP_ID = os.getenv('ADZUNA_APP_ID')
     ADZUNA_APP_KEY = os.getenv('ADZUNA_APP_KEY')
     if not ADZUNA_APP_ID or not ADZUNA_APP_KEY:
-        return "Job search API credentials are not set."
+        return JOB_SEARCH_CREDENTIALS_MESSAGE
 
     # Prepare the API endpoint
     country = 'us'  # Change to your target country code
@@ -334,8 +437,7 @@ def get_job_listings(skills: str, location: str = None):
         params['where'] = location
 
     try:
-        response = requests.get(base_url, params=params)
-        data = response.json()
+        data = http_client.get_json(base_url, params=params)
         results = data.get('results', [])
         if not results:
             return "No job listings found matching your skills."
@@ -353,4 +455,4 @@ def get_job_listings(skills: str, location: str = None):
 
     except Exception as e:
         print(f"Failed to fetch job listings: {e}")
-        return "Sorry, I couldn't fetch job listings at the moment."
\ No newline at end of file
+        return JOB_SEARCH_ERROR_MESSAGE
\ No newline at end of file
@@ -5,6 +5,62 @@ APP_NAME = "GNEC"
 
 PROCESSING_STEP = 1 # The chat turn upon which the app would update the database
 CONTEXT_LENGTH_LIMIT=4096 
+CHAT_HISTORY_WINDOW_TURNS = 6 # Most recent chat turns sent to the model verbatim; older turns are summarized
+PAST_SUMMARIES_TOKEN_BUDGET = 800 # Tokens of past chat summaries injected into the prompt
+PAST_SUMMARIES_MAX_CANDIDATES = 50 # Most recent past summaries considered for the prompt
+PAST_SUMMARIES_RECENCY_HALF_LIFE = 5 # Sessions after which a summary's recency score halves
+
+AGENT_POOL_MAX_IDLE_PER_KEY = 4 # Idle agents kept per (role, tool set)
+AGENT_POOL_MAX_KEYS = 32 # Distinct (role, tool set) combinations kept warm
+QUERY_EMBEDDING_CACHE_SIZE = 1024 # Query embeddings kept in memory
+AGENT_FACTS_ANSWER_CACHE_SIZE = 256 # Formatted agent fact answers kept in memory
+
+EMBEDDING_BATCH_SIZE = 256 # Texts per embeddings request
+EMBEDDING_MAX_BATCH_TOKENS = 100_000 # Tokens per embeddings request
+EMBEDDING_MAX_CONCURRENCY = 4 # Embeddings requests in flight
+EMBEDDING_TOKENS_PER_MINUTE = 350_000 # Token budget of the embeddings deployment
+EMBEDDING_MAX_RETRIES = 6 # Retries per batch on 429 responses
+
+TOOL_EXECUTOR_MAX_WORKERS = 16 # Agent tool calls running at the same time, across requests
+DEFAULT_TOOL_TIMEOUT_SECONDS = 20 # Time an agent waits for a running tool unless the toolbox sets a timeout
+TOOL_QUEUE_TIMEOUT_SECONDS = 10 # Time a tool call waits for a free tool thread before it is turned down
+
+HTTP_MAX_HOST_POOLS = 16 # Upstream hosts whose keep-alive connection pools are kept
+HTTP_PER_HOST_CONCURRENCY = 8 # Requests in flight to a single upstream host
+HTTP_CONNECT_TIMEOUT_SECONDS = 3.05
+HTTP_READ_TIMEOUT_SECONDS = 10
+SOCKET_DEFAULT_TIMEOUT_SECONDS = 15 # Socket timeout of clients that set none of their own (YouTube and Tavily search)
+
+TEXTBOOK_SEARCH_TOP_N = 3 # Open Library results returned by the textbook search tool
+OPENLIBRARY_SEARCH_CACHE_TTL_SECONDS = 6 * 60 * 60
+OPENLIBRARY_EDITION_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+TOOL_RESULT_CACHE_MAX_ENTRIES = 2048 # Tool results kept in memory in front of the Mongo cache
+USER_PROFILE_CACHE_SIZE = 1024 # User profiles kept in memory for the agent's profile tool
+USER_PROFILE_CACHE_TTL_SECONDS = 60
+
+MONGO_MAX_POOL_SIZE = 50 # Connections per server in the shared MongoDB client's pool
+MONGO_MIN_POOL_SIZE = 2 # Connections kept open while idle
+MONGO_MAX_IDLE_TIME_MS = 120_000 # Idle connections are closed before the server drops them
+MONGO_COMPRESSORS = "zlib" # Wire compressors in order of preference; add "zstd" when the zstandard package is installed
+MONGO_SERVER_SELECTION_TIMEOUT_MS = 5_000
+MONGO_CONNECT_TIMEOUT_MS = 5_000
+MONGO_MAX_RETRIES = 5 # Retries of a throttled or transient MongoDB operation
+MONGO_RETRY_BASE_DELAY_SECONDS = 0.05 # First backoff when the server gives no RetryAfterMs hint
+MONGO_RETRY_MAX_DELAY_SECONDS = 5.0
+MONGO_RETRY_BUDGET = 100 # Retries that can be spent in a burst across all operations
+MONGO_RETRY_BUDGET_REFILL = 0.2 # Retry tokens earned by each successful operation
+MONGO_LOAD_BATCH_SIZE = 1000 # Documents per bulk write when loading seed data
+MONGO_LOAD_CONCURRENCY = 4 # Bulk writes in flight when loading seed data
+
+EXTRACTION_CACHE_MEMORY_CHARS = 20_000_000 # Characters of extracted document text kept in memory
+EXTRACTION_CACHE_DISK_MAX_BYTES = 512 * 1024 * 1024 # Size of the on-disk extracted text cache
+EXTRACTION_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+PDF_MIN_TEXT_CHARS_PER_PAGE = 20 # PDF pages with less text than this are sent to Form Recognizer
+EXTRACTION_MAX_CHARS = 200_000 # Spreadsheet extraction stops past this, as the prompt cannot use more text
+XLSX_MAX_ROWS_PER_SHEET = 5_000 # Rows read from each sheet of an uploaded workbook
+XLSX_MAX_COLUMNS = 50 # Leading columns read from each row of an uploaded workbook
+EXTRACTION_WORKERS = 2 # Processes extracting the text of uploaded documents in the background
+EXTRACTION_JOB_STALE_SECONDS = 10 * 60 # Processing jobs not updated for this long are submitted again
 
 """STEP 2: Define the system message for the agent."""
 SYSTEM_MESSAGE = """
@@ -0,0 +1,171 @@
+""" This module contains a small on-disk cache with per-entry expiry and a size bound. """
+""" Step 1: Import necessary modules """
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from utils.metrics import register_metrics_source
+
+CACHE_ROOT = os.path.join(os.path.dirname(__file__), '..', 'cache')
+_caches = []
+
+""" Step 2: Define the DiskCache class """
+class DiskCache:
+    """
+    Stores JSON-serializable values as files named after the SHA-256 of their key.
+
+    Entries expire after their TTL. Each file's mtime is set to its expiry time and its
+    atime to its last access, so pruning only needs to stat the files. When `max_bytes`
+    is set, pruning also removes the least recently used entries until the cache fits.
+    Pruning runs in the scheduled `prune_disk_caches_job`, never on the request path.
+    """
+
+    def __init__(self, name: str, default_ttl: float, max_bytes: int = None):
+        """
+        Initializes a DiskCache object.
+
+        Args:
+            name (str): The name of the cache, used as its directory under the cache root.
+            default_ttl (float): The number of seconds entries are kept unless `set` is given a TTL.
+            max_bytes (int): The maximum total size of the cache files, or None for no bound.
+        """
+        self.name = name
+        self.directory = os.path.join(CACHE_ROOT, name)
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        _caches.append(self)
+
+    def _get_path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.json")
+
+    def get(self, key: str):
+        """
+        Returns the cached value for a key, or None if it is missing or expired.
+        """
+        path = self._get_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        if entry is None or entry.get("expires_at", 0) < time.time():
+            if entry is not None:
+                self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path, (time.time(), entry["expires_at"]))
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return entry.get("value")
+
+    def set(self, key: str, value, ttl: float = None):
+        """
+        Stores a value for a key.
+
+        Args:
+            key (str): The cache key.
+            value: The JSON-serializable value.
+            ttl (float): The number of seconds to keep the entry. Defaults to the cache's TTL.
+        """
+        path = self._get_path(key)
+        entry = {"expires_at": time.time() + (ttl or self.default_ttl), "value": value}
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial entry
+            temp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.utime(temp_path, (time.time(), entry["expires_at"]))
+            os.replace(temp_path, path)
+        except (OSError, TypeError) as e:
+            logging.warning(f"Failed to write '{self.name}' cache entry: {e}")
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def prune(self) -> int:
+        """
+        Removes expired entries and, if the cache is over `max_bytes`, the least recently used ones.
+
+        Returns:
+            int: The number of removed entries.
+        """
+        if not os.path.isdir(self.directory):
+            return 0
+
+        now = time.time()
+        removed = 0
+        entries = []
+        for root, _, filenames in os.walk(self.directory):
+            for filename in filenames:
+                path = os.path.join(root, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+
+                if filename.endswith(".json"):
+                    expired = stat.st_mtime < now
+                else:
+                    # Leftover temporary files from interrupted writes
+                    expired = stat.st_ctime < now - 3600
+
+                if expired:
+                    self._remove(path)
+                    removed += 1
+                else:
+                    entries.append((stat.st_atime, stat.st_size, path))
+
+        if self.max_bytes is not None:
+            total_bytes = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total_bytes <= self.max_bytes:
+                    break
+                self._remove(path)
+                total_bytes -= size
+                removed += 1
+
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+""" Step 3: Define the cache maintenance helpers """
+def prune_disk_caches_job():
+    """
+    Prunes every disk cache created in this process.
+    """
+    for cache in list(_caches):
+        removed = cache.prune()
+        logging.info(f"Pruned {removed} entries from the '{cache.name}' disk cache.")
+
+
+def get_disk_cache_stats() -> dict:
+    return {cache.name: cache.stats() for cache in list(_caches)}
+
+
+register_metrics_source("disk_caches", get_disk_cache_stats)
@@ -0,0 +1,78 @@
+""" This module runs the app's coroutines on one long-lived event loop shared by every request. """
+""" Step 1: Import necessary modules """
+import asyncio
+import threading
+from utils.metrics import register_metrics_source
+
+""" Step 2: Define the EventLoopThread class """
+class EventLoopThread:
+    """
+    An event loop that runs forever on a daemon thread.
+
+    Async clients, such as the httpx client of a pooled agent's LLM, are bound to the loop
+    they were first used on. Running every coroutine on this one loop, instead of a new
+    loop per request, lets warm agents keep their clients across requests. Synchronous
+    views hand their coroutines to the loop and wait for the result.
+    """
+
+    def __init__(self, name: str = "event-loop"):
+        """
+        Initializes an EventLoopThread object. The loop is started on first use, so that
+        processes forked after import (e.g. WSGI workers) each start their own.
+
+        Args:
+            name (str): The name of the loop's thread.
+        """
+        self.name = name
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coroutine):
+        """
+        Schedules a coroutine on the loop and returns its concurrent.futures.Future.
+        """
+        loop = self.get_loop()
+        if threading.current_thread() is self._thread:
+            # Waiting on the loop's own thread for a result it has to produce would deadlock
+            coroutine.close()
+            raise RuntimeError("Coroutines cannot be submitted from the shared event loop's own thread.")
+        return asyncio.run_coroutine_threadsafe(coroutine, loop)
+
+    def run(self, coroutine, timeout: float = None):
+        """
+        Runs a coroutine on the loop and blocks until it returns.
+
+        Args:
+            coroutine: The coroutine to run.
+            timeout (float): The number of seconds to wait, or None to wait until it completes.
+        """
+        future = self.submit(coroutine)
+        try:
+            return future.result(timeout)
+        except BaseException:
+            # The caller stopped waiting, so the coroutine does not need to finish
+            future.cancel()
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            loop = self._loop
+        if loop is None:
+            return {"running": False, "tasks": 0}
+        # Tasks are only read here, so the count may be off by the ones scheduled meanwhile
+        return {"running": loop.is_running(), "tasks": len(asyncio.all_tasks(loop))}
+
+
+""" Step 3: Create the shared event loop """
+event_loop = EventLoopThread()
+register_metrics_source("event_loop", event_loop.stats)
@@ -0,0 +1,116 @@
+""" This module provides the shared HTTP client used for calls to external APIs. """
+""" Step 1: Import necessary modules """
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from utils.consts import (
+    HTTP_MAX_HOST_POOLS,
+    HTTP_PER_HOST_CONCURRENCY,
+    HTTP_CONNECT_TIMEOUT_SECONDS,
+    HTTP_READ_TIMEOUT_SECONDS,
+)
+from utils.metrics import register_metrics_source
+
+""" Step 2: Define the HttpClient class """
+class HttpClient:
+    """
+    A pooled, keep-alive HTTP client shared by all external tool calls.
+
+    Connections are reused per host, the number of concurrent requests to a single
+    host is capped, every request has connect and read timeouts, and latency and
+    error counts are recorded per upstream host.
+    """
+
+    def __init__(self, max_host_pools: int = HTTP_MAX_HOST_POOLS, per_host_concurrency: int = HTTP_PER_HOST_CONCURRENCY, timeout: tuple = (HTTP_CONNECT_TIMEOUT_SECONDS, HTTP_READ_TIMEOUT_SECONDS)):
+        """
+        Initializes an HttpClient object.
+
+        Args:
+            max_host_pools (int): The number of hosts whose connection pools are kept.
+            per_host_concurrency (int): The maximum number of requests in flight to, and keep-alive connections kept for, a single host.
+            timeout (tuple): The default (connect, read) timeouts in seconds.
+        """
+        self.timeout = timeout
+        self.per_host_concurrency = per_host_concurrency
+        self._host_limits = {}
+        self._host_stats = {}
+        self._lock = threading.Lock()
+
+        retries = Retry(
+            total=2,
+            backoff_factor=0.3,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=["GET"],
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(pool_connections=max_host_pools, pool_maxsize=per_host_concurrency, max_retries=retries)
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _get_host_limit(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            limit = self._host_limits.get(host)
+            if limit is None:
+                limit = self._host_limits[host] = threading.BoundedSemaphore(self.per_host_concurrency)
+                self._host_stats[host] = {"requests": 0, "errors": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            return limit
+
+    def _record(self, host: str, elapsed: float, failed: bool):
+        with self._lock:
+            stats = self._host_stats[host]
+            stats["requests"] += 1
+            stats["errors"] += int(failed)
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    def get(self, url: str, params: dict = None, timeout=None, **kwargs) -> requests.Response:
+        """
+        Sends a GET request through the shared session.
+
+        Args:
+            url (str): The URL to request.
+            params (dict): The query string parameters.
+            timeout: The (connect, read) timeouts. Defaults to the client's timeouts.
+        """
+        host = urlsplit(url).netloc
+        failed = True
+        started = time.perf_counter()
+
+        with self._get_host_limit(host):
+            try:
+                response = self.session.get(url, params=params, timeout=timeout or self.timeout, **kwargs)
+                failed = response.status_code >= 400
+                return response
+            finally:
+                self._record(host, time.perf_counter() - started, failed)
+
+    def get_json(self, url: str, params: dict = None, timeout=None, **kwargs):
+        """
+        Sends a GET request and returns the decoded JSON body, raising on HTTP errors.
+        """
+        response = self.get(url, params=params, timeout=timeout, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def stats(self) -> dict:
+        """
+        Returns request counts, error counts and latencies per upstream host.
+        """
+        with self._lock:
+            return {
+                host: {
+                    **stats,
+                    "avg_seconds": (stats["total_seconds"] / stats["requests"]) if stats["requests"] else 0.0,
+                }
+                for host, stats in self._host_stats.items()
+            }
+
+
+""" Step 3: Create the shared client """
+http_client = HttpClient()
+register_metrics_source("http_client", http_client.stats)
@@ -0,0 +1,40 @@
+""" This module collects runtime metrics exposed by the app's caches, pools and clients. """
+""" Step 1: Import necessary modules """
+import logging
+import threading
+
+""" Step 2: Define the metrics registry """
+_sources = {}
+_lock = threading.Lock()
+
+
+def register_metrics_source(name, stats_func):
+    """
+    Registers a callable that returns a JSON-serializable dict of metrics.
+
+    Args:
+        name (str): The key under which the metrics are reported.
+        stats_func (callable): A function with no arguments that returns the metrics.
+    """
+    with _lock:
+        _sources[name] = stats_func
+
+
+def collect_metrics():
+    """
+    Collects the metrics of every registered source.
+
+    Returns:
+        dict: The metrics keyed by source name.
+    """
+    with _lock:
+        sources = dict(_sources)
+
+    metrics = {}
+    for name, stats_func in sources.items():
+        try:
+            metrics[name] = stats_func()
+        except Exception as e:
+            logging.error(f"Failed to collect metrics for '{name}': {e}")
+            metrics[name] = {"error": str(e)}
+    return metrics
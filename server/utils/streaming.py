@@ -0,0 +1,143 @@
+""" This module contains helpers for streaming responses to the client and parsing streamed data. """
+""" Step 1: Import necessary modules """
+import codecs
+import json
+import queue
+import threading
+from itertools import islice
+from utils.event_loop import event_loop
+
+""" Step 2: Define the helper functions """
+# Marks the end of a stream handed over by `iterate_async_generator`
+_STREAM_END = object()
+
+
+def format_sse(event: dict) -> str:
+    """
+    Formats an event as a server-sent events message.
+
+    Args:
+        event (dict): The JSON-serializable event payload.
+    """
+    return f"data: {json.dumps(event, default=str)}\n\n"
+
+
+def iterate_async_generator(async_generator):
+    """
+    Consumes an async generator from synchronous code, such as a streamed Flask response.
+
+    The generator runs on the shared event loop and hands its items over through a queue,
+    so items are yielded to the caller as soon as they are available. If the caller stops
+    early (e.g. the client disconnected), the generator is cancelled and closed.
+
+    Args:
+        async_generator: The async generator to consume.
+    """
+    items = queue.Queue()
+    finished = threading.Event()
+
+    async def pump():
+        try:
+            async for item in async_generator:
+                items.put((item, None))
+        except BaseException as e:
+            items.put((_STREAM_END, e))
+            raise
+        finally:
+            try:
+                await async_generator.aclose()
+            finally:
+                finished.set()
+        items.put((_STREAM_END, None))
+
+    future = event_loop.submit(pump())
+    try:
+        while True:
+            item, error = items.get()
+            if item is _STREAM_END:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        future.cancel()
+        # The generator may hold a pooled agent, which must not be reused until the generator has stopped
+        finished.wait()
+
+
+def iter_json_array(chunks):
+    """
+    Parses a JSON array incrementally and yields its items as soon as they are complete,
+    so that large datasets can be processed without holding the whole document in memory.
+
+    Args:
+        chunks: An iterable of bytes or str chunks of a document whose top level is an array.
+    """
+    decoder = json.JSONDecoder()
+    utf8_decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+    started = False
+    exhausted = False
+
+    def read_more():
+        nonlocal buffer, position, exhausted
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            exhausted = True
+            chunk = utf8_decoder.decode(b"", final=True)
+        else:
+            if isinstance(chunk, bytes):
+                chunk = utf8_decoder.decode(chunk)
+        # Drop the consumed prefix so the buffer stays proportional to one item
+        buffer = buffer[position:] + chunk
+        position = 0
+
+    while True:
+        while position < len(buffer) and (buffer[position].isspace() or (started and buffer[position] == ",")):
+            position += 1
+
+        if position == len(buffer):
+            if exhausted:
+                raise ValueError("Unexpected end of JSON array.")
+            read_more()
+            continue
+
+        if not started:
+            if buffer[position] != "[":
+                raise ValueError("Expected a JSON array.")
+            started = True
+            position += 1
+            continue
+
+        if buffer[position] == "]":
+            return
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if exhausted:
+                raise
+            read_more()
+            continue
+
+        # A scalar is only complete once the next delimiter has arrived, e.g. "2" may continue as "2.5"
+        if not isinstance(item, (dict, list)) and not exhausted:
+            rest = buffer[end:].lstrip()
+            if not rest or rest[0] not in ",]":
+                read_more()
+                continue
+
+        position = end
+        yield item
+
+
+def iter_batches(iterable, batch_size: int):
+    """
+    Yields lists of up to `batch_size` consecutive items of an iterable.
+    """
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, batch_size)):
+        yield batch